@@ -118,6 +118,7 @@ Scenario: List all Customers
     And I should see "Whiskers" in the results
     And I should see "Rex" in the results
     And I should see "Tweety" in the results
+    And I should see "Page 1" in the results
 
 Scenario: Query a Customer by Member Since
     When I visit the "Home Page"
@@ -22,6 +22,11 @@ import sys
 from flask import Flask
 from service import config
 from service.common import log_handlers
+from service.common.admission import init_admission
+from service.common.deadlines import init_deadlines
+from service.common.group_commit import GroupCommit
+from service.common.ttl_cache import TTLCache
+from service.common.tracing import init_tracing
 
 
 ############################################################
@@ -37,13 +42,24 @@ def create_app():
     # pylint: disable=import-outside-toplevel
     from service.models import db
     db.init_app(app)
+    if app.config["GROUP_COMMIT_WINDOW"]:
+        app.extensions["group_commit"] = GroupCommit(
+            app.config["GROUP_COMMIT_WINDOW"], app.config["GROUP_COMMIT_MAX_BATCH"]
+        )
+    app.extensions["stats_cache"] = TTLCache(app.config["STATS_CACHE_TTL"])
+    app.extensions["readiness_cache"] = TTLCache(app.config["READINESS_CACHE_TTL"])
+    # imported here so that the assets can be compressed without an app
+    from service.common.assets import init_assets
+    init_assets(app)
 
     with app.app_context():
         # Dependencies require we import the routes AFTER the Flask app is created
         # pylint: disable=wrong-import-position, wrong-import-order, unused-import
         from service import routes, models  # noqa: F401 E402
-        from service.common import error_handlers, cli_commands  # noqa: F401, E402
+        from service.common import error_handlers, cli_commands, compression  # noqa: F401, E402
 
+        # before the first connection is made, so that every one gets the timeout
+        init_deadlines(app, db.engine)
         try:
             db.create_all()
         except Exception as error:  # pylint: disable=broad-except
@@ -53,6 +69,15 @@ def create_app():
 
         # Set up logging for production
         log_handlers.init_logging(app, "gunicorn.error")
+        init_tracing(app, db.engine)
+        init_admission(app)
+
+        from service.common.jobs import JobRunner
+        app.extensions["jobs"] = JobRunner(app).start()
+
+        if app.config["OUTBOX_ENABLED"] and app.config["OUTBOX_SINK_URL"]:
+            from service.common.outbox import OutboxDispatcher
+            app.extensions["outbox_dispatcher"] = OutboxDispatcher(app).start()
 
         app.logger.info(70 * "*")
         app.logger.info("  S E R V I C E   R U N N I N G  ".center(70, "*"))
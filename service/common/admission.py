@@ -0,0 +1,110 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Admission Control
+
+Limits how many database-bound requests each worker process runs at once.
+A request that cannot get a slot within a short wait is turned away with
+503 and Retry-After instead of queuing for a database connection, so
+latency stays bounded when Postgres slows down and the endpoints that do
+not touch the database keep answering.
+
+With a target latency set the limit adapts: it shrinks by a tenth whenever
+a request takes longer than the target and grows back by about one per
+limit's worth of fast requests.
+"""
+import threading
+import time
+from flask import g, request
+from flask import current_app as app  # Import Flask application
+from werkzeug.exceptions import ServiceUnavailable
+
+# Endpoints that must answer under overload: they do not use the database,
+# or like the readiness check only ping it now and then
+EXEMPT_ENDPOINTS = {"static", "index", "get_service_info", "health_check", "readiness_check"}
+
+
+class AdmissionController:
+    """An adaptive limit on the number of requests running at once"""
+
+    def __init__(self, max_concurrency: int, max_wait: float = 0.1, target_latency: float = 0, min_concurrency: int = 1):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(min(min_concurrency, max_concurrency), 1)
+        self.max_wait = max_wait
+        self.target_latency = target_latency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.rejected = 0
+        self._available = threading.Condition()
+
+    def acquire(self) -> bool:
+        """
+        Takes a slot, waiting up to max_wait for one to free up
+
+        Returns:
+            bool: False if the request should be turned away
+        """
+        with self._available:
+            if not self._available.wait_for(lambda: self.in_flight < int(self.limit), self.max_wait):
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float) -> None:
+        """Gives back a slot and adjusts the limit to how long it was held"""
+        with self._available:
+            self.in_flight -= 1
+            if self.target_latency:
+                if latency > self.target_latency:
+                    self.limit = max(self.limit * 0.9, self.min_concurrency)
+                else:
+                    self.limit = min(self.limit + 1 / self.limit, self.max_concurrency)
+            self._available.notify()
+
+
+def admit_request():
+    """Turns the request away with 503 if the worker is at its limit"""
+    controller = app.extensions.get("admission")
+    if controller is None or request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+        return
+    if not controller.acquire():
+        raise ServiceUnavailable(
+            "The service is overloaded, try again later", retry_after=app.config["ADMISSION_RETRY_AFTER"]
+        )
+    g.admitted_at = time.monotonic()
+
+
+def release_request(_error=None):
+    """Frees the request's slot once it is done"""
+    admitted_at = g.pop("admitted_at", None)
+    if admitted_at is not None:
+        app.extensions["admission"].release(time.monotonic() - admitted_at)
+
+
+def init_admission(flask_app) -> None:
+    """Limits the concurrent requests to flask_app unless ADMISSION_MAX_CONCURRENCY is 0"""
+    if not flask_app.config["ADMISSION_MAX_CONCURRENCY"]:
+        return
+    flask_app.extensions["admission"] = AdmissionController(
+        flask_app.config["ADMISSION_MAX_CONCURRENCY"],
+        flask_app.config["ADMISSION_MAX_WAIT"],
+        flask_app.config["ADMISSION_TARGET_LATENCY"],
+        flask_app.config["ADMISSION_MIN_CONCURRENCY"],
+    )
+    flask_app.before_request(admit_request)
+    flask_app.teardown_request(release_request)
@@ -0,0 +1,187 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Static Assets
+
+Serves the admin UI's static files under content-hashed URLs such as
+static/js/rest_api.3f2a9c1b0d4e.js. A hashed URL never changes meaning, so
+browsers may cache it for a year without revalidating, and index.html is
+rewritten to point at the hashed URLs. Files compressed ahead of time with
+
+    python -m service.common.assets service/static
+
+are sent as they are to clients that accept gzip or brotli.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from flask import request, send_from_directory
+from flask import current_app as app  # Import Flask application
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Variants written next to each compressible file, most preferred first
+PRECOMPRESSED = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE = (".css", ".html", ".js", ".json", ".svg", ".txt")
+
+STATIC_URL = re.compile(r'((?:href|src)\s*=\s*")static/([^"]+)"')
+
+
+def hashed_name(filename: str, digest: str) -> str:
+    """Returns filename with the digest before its extension"""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{digest}{ext}"
+
+
+def is_current(variant: str, path: str) -> bool:
+    """Tells whether a compressed variant exists and is newer than its file"""
+    return os.path.isfile(variant) and os.path.getmtime(variant) >= os.path.getmtime(path)
+
+
+def static_files(folder: str):
+    """Yields the path of every file in folder except compressed variants"""
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if not name.endswith(tuple(PRECOMPRESSED.values())):
+                yield os.path.join(root, name)
+
+
+class AssetManifest:
+    """The hashed name and precompressed variants of every static file"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.hashed = {}
+        self.sources = {}
+        self.variants = {}
+        self._pages = {}
+        for path in static_files(folder):
+            filename = os.path.relpath(path, folder).replace(os.sep, "/")
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()[:12]
+            self.hashed[filename] = hashed_name(filename, digest)
+            self.sources[self.hashed[filename]] = filename
+            self.variants[filename] = {
+                encoding: filename + suffix
+                for encoding, suffix in PRECOMPRESSED.items()
+                if is_current(path + suffix, path)
+            }
+
+    def url(self, filename: str) -> str:
+        """Returns the hashed URL of a static file"""
+        return "static/" + self.hashed.get(filename, filename)
+
+    def rewrite(self, html: str) -> str:
+        """Points the static/ URLs in a page at their hashed names"""
+        return STATIC_URL.sub(lambda match: f'{match[1]}{self.url(match[2])}"', html)
+
+    def page(self, filename: str) -> str:
+        """Returns a page from the static folder with hashed URLs, reading it once"""
+        if filename not in self._pages:
+            with open(os.path.join(self.folder, filename), encoding="utf-8") as file:
+                self._pages[filename] = self.rewrite(file.read())
+        return self._pages[filename]
+
+
+def serve_asset(filename: str):
+    """
+    Sends a static file
+
+    Hashed names are cached for ASSET_MAX_AGE and marked immutable. Plain
+    names keep Flask's default of revalidating with the ETag every time.
+    """
+    manifest = app.extensions["assets"]
+    source = manifest.sources.get(filename)
+    name = source or filename
+    variants = manifest.variants.get(name, {})
+    encoding = request.accept_encodings.best_match(list(variants)) if variants else None
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    response = send_from_directory(
+        manifest.folder,
+        variants[encoding] if encoding else name,
+        mimetype=mimetype,
+        max_age=app.config["ASSET_MAX_AGE"] if source else None,
+    )
+    if variants:
+        response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if source:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+def send_page(filename: str):
+    """
+    Sends a page that links to hashed assets
+
+    The page itself must be revalidated on every load so that it picks up
+    new asset URLs, which is cheap with its ETag.
+    """
+    response = app.response_class(app.extensions["assets"].page(filename), mimetype="text/html")
+    # weak, because the compression may change the bytes but not the meaning
+    response.add_etag(weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def init_assets(flask_app) -> None:
+    """Builds the manifest and serves static files through serve_asset"""
+    flask_app.extensions["assets"] = AssetManifest(flask_app.static_folder)
+    flask_app.view_functions["static"] = serve_asset
+
+
+######################################################################
+# Compress static files ahead of time
+######################################################################
+def precompress(folder: str) -> list:
+    """
+    Writes a .gz, and a .br when brotli is installed, next to each
+    compressible file in folder that does not have an up to date one
+
+    Returns:
+        list: the paths written
+    """
+    compressors = {".gz": lambda data: gzip.compress(data, 9, mtime=0)}
+    if brotli:  # pragma: no cover
+        compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+    written = []
+    for path in static_files(folder):
+        if not path.endswith(COMPRESSIBLE):
+            continue
+        with open(path, "rb") as file:
+            data = file.read()
+        for suffix, compress in compressors.items():
+            target = path + suffix
+            if is_current(target, path):
+                continue
+            with open(target, "wb") as file:
+                file.write(compress(data))
+            written.append(target)
+    return written
+
+
+if __name__ == "__main__":  # pragma: no cover
+    for written_path in precompress(sys.argv[1] if len(sys.argv) > 1 else "service/static"):
+        print(written_path)
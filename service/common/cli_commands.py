@@ -16,8 +16,11 @@
 """
 Flask CLI Command Extensions
 """
+from datetime import datetime, timedelta
+import click
 from flask import current_app as app  # Import Flask application
-from service.models import db
+from service.models import db, CustomerTombstone, IdempotencyKey, PARTITION_BY, create_partitions
+from service.common.outbox import OutboxDispatcher
 
 
 ######################################################################
@@ -34,3 +37,78 @@ def db_create():
     db.drop_all()
     db.create_all()
     db.session.commit()
+
+
+######################################################################
+# Command to prune old change feed tombstones
+# Usage:
+#   flask prune-tombstones --days 30
+######################################################################
+@app.cli.command("prune-tombstones")
+@click.option("--days", default=30, show_default=True, help="Keep tombstones newer than this")
+def prune_tombstones(days):
+    """
+    Removes tombstones of deleted Customers from the change feed once every
+    client has had time to see them
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    count = db.session.query(CustomerTombstone).filter(CustomerTombstone.deleted_at < cutoff).delete()
+    db.session.commit()
+    click.echo(f"Removed {count} tombstones")
+
+
+######################################################################
+# Command to prune expired idempotency keys
+# Usage:
+#   flask prune-idempotency-keys
+######################################################################
+@app.cli.command("prune-idempotency-keys")
+def prune_idempotency_keys():
+    """
+    Removes the Idempotency-Key records of POST /customers that are older
+    than IDEMPOTENCY_TTL
+    """
+    count = (
+        db.session.query(IdempotencyKey)
+        .filter(IdempotencyKey.created_at <= IdempotencyKey.cutoff())
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    click.echo(f"Removed {count} idempotency keys")
+
+
+######################################################################
+# Command to deliver outbox events from a separate process
+# Usage:
+#   flask outbox-dispatch
+######################################################################
+@app.cli.command("outbox-dispatch")
+def outbox_dispatch():
+    """
+    Delivers outbox events to OUTBOX_SINK_URL until interrupted
+    """
+    if not app.config["OUTBOX_SINK_URL"]:
+        raise click.UsageError("OUTBOX_SINK_URL is not set")
+    OutboxDispatcher(app._get_current_object()).run()
+
+
+######################################################################
+# Command to add monthly partitions ahead of time
+# Usage:
+#   flask create-partitions --months 12 --start 2025-01-01
+######################################################################
+@app.cli.command("create-partitions")
+@click.option("--months", default=12, show_default=True, help="Number of monthly partitions to create")
+@click.option("--start", type=click.DateTime(["%Y-%m-%d"]), help="First month to create [default: this month]")
+def create_partitions_command(months, start):
+    """
+    Creates any missing partitions of the customer table. Run it on a
+    schedule when CUSTOMER_PARTITION_BY=range so new members always have a
+    monthly partition to land in. Rows the default partition holds are
+    moved into monthly partitions of their own.
+    """
+    if not PARTITION_BY:
+        raise click.UsageError("CUSTOMER_PARTITION_BY is not set")
+    names = create_partitions(db.session.connection(), start.date() if start else None, months)
+    db.session.commit()
+    click.echo(f"Partitions: {', '.join(names)}")
@@ -0,0 +1,119 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Response Compression
+
+Compresses responses with the best encoding the client accepts. gzip is
+always available; brotli and zstd are used when their packages are installed.
+"""
+import zlib
+from flask import request
+from flask import current_app as app  # Import Flask application
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class _Brotli:  # pragma: no cover
+    """Gives brotli the same compress/flush interface as zlib"""
+
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk of data"""
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        """Finishes the stream"""
+        return self._compressor.finish()
+
+
+# The levels each encoding accepts, from fastest to smallest
+LEVELS = {"gzip": (1, 9), "br": (0, 11), "zstd": (1, 22)}
+
+
+def _compressor(encoding: str, level: int):
+    """Returns a streaming compressor for the encoding, at the nearest level it accepts"""
+    lowest, highest = LEVELS[encoding]
+    level = min(max(level, lowest), highest)
+    if encoding == "br":  # pragma: no cover
+        return _Brotli(level)
+    if encoding == "zstd":  # pragma: no cover
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def supported_encodings() -> list:
+    """Returns the encodings we can produce, most preferred first"""
+    encodings = ["gzip"]
+    if brotli:  # pragma: no cover
+        encodings.insert(0, "br")
+    if zstandard:  # pragma: no cover
+        encodings.insert(0, "zstd")
+    return encodings
+
+
+def _stream(chunks, compressor):
+    """Compresses a streamed response chunk by chunk"""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+######################################################################
+# Compress responses after each request
+######################################################################
+@app.after_request
+def compress_response(response):
+    """Compresses the response if the client accepts it and it is worth it"""
+    if (
+        not app.config.get("COMPRESSION_ENABLED", True)
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(supported_encodings())
+    if not encoding:
+        return response
+    compressor = _compressor(encoding, app.config.get("COMPRESSION_LEVEL", 6))
+
+    if response.is_streamed:
+        response.response = _stream(response.response, compressor)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < app.config.get("COMPRESSION_MIN_SIZE", 1024):
+            return response
+        response.set_data(compressor.compress(data) + compressor.flush())
+
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,97 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Deadlines
+
+Every connection gets STATEMENT_TIMEOUT as its Postgres statement_timeout.
+Each request has a deadline, ROUTE_TIMEOUTS[endpoint] or STATEMENT_TIMEOUT
+seconds after it starts:
+
+- transactions begun by a route with its own timeout run with it as
+  SET LOCAL statement_timeout, so no statement outlives the route
+- no statement is sent once the deadline has passed
+
+Transactions begun outside of a request, by jobs and CLI commands, run
+with SET LOCAL statement_timeout = 0: they work through whole tables and
+have no client waiting on them.
+
+Either way the request fails with DeadlineExceeded, which the error
+handlers answer with 504, and the connection goes back to the pool.
+"""
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+try:
+    from psycopg.errors import QueryCanceled
+except ImportError:  # pragma: no cover
+    QueryCanceled = None
+
+
+class DeadlineExceeded(Exception):
+    """Used when a request runs out of time"""
+
+
+def route_timeout(app, endpoint: str) -> float:
+    """Returns how many seconds requests to endpoint may take"""
+    return app.config["ROUTE_TIMEOUTS"].get(endpoint, app.config["STATEMENT_TIMEOUT"])
+
+
+def transaction_timeout(default_timeout: float):
+    """Returns the statement timeout for a transaction begun now, None if it has none of its own"""
+    if has_request_context():
+        return g.get("timeout")
+    return 0 if default_timeout else None
+
+
+def init_deadlines(app, engine) -> None:
+    """Gives the requests to app deadlines and the statements run on engine timeouts"""
+    default_timeout = app.config["STATEMENT_TIMEOUT"]
+
+    @app.before_request
+    def start_deadline():
+        g.timeout = route_timeout(app, request.endpoint)
+        g.deadline = time.monotonic() + g.timeout if g.timeout else None
+
+    @event.listens_for(engine, "connect")
+    def set_statement_timeout(dbapi_connection, _connection_record):
+        if not default_timeout:
+            return
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"SET statement_timeout = {int(default_timeout * 1000)}")
+        dbapi_connection.commit()
+
+    @event.listens_for(engine, "begin")
+    def set_route_timeout(conn):
+        timeout = transaction_timeout(default_timeout)
+        if timeout is None or timeout == default_timeout:
+            return
+        # straight on the DBAPI cursor, so it is not counted or traced as a query
+        with conn.connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def check_deadline(*_args):
+        deadline = g.get("deadline") if has_request_context() else None
+        if deadline is not None and time.monotonic() > deadline:
+            raise DeadlineExceeded(f"{request.endpoint} ran out of time after {g.timeout:g}s")
+
+    @event.listens_for(engine, "handle_error")
+    def statement_timed_out(exception_context):
+        if QueryCanceled and isinstance(exception_context.original_exception, QueryCanceled):
+            return DeadlineExceeded(f"The database canceled a statement: {exception_context.original_exception}")
+        return None
@@ -18,7 +18,10 @@ Module: error_handlers
 """
 from flask import jsonify
 from flask import current_app as app  # Import Flask application
-from service.models import DataValidationError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from werkzeug.exceptions import ServiceUnavailable
+from service.models import DataValidationError, VersionConflictError
+from service.common.deadlines import DeadlineExceeded
 from . import status
 
 
@@ -27,8 +30,38 @@ from . import status
 ######################################################################
 @app.errorhandler(DataValidationError)
 def request_validation_error(error):
-    """Handles Value Errors from bad data"""
-    return bad_request(error)
+    """Handles Value Errors from bad data, listing every problem found"""
+    message = str(error)
+    app.logger.warning(message)
+    return (
+        jsonify(
+            status=status.HTTP_400_BAD_REQUEST,
+            error="Bad Request",
+            message=message,
+            errors=error.errors or [message],
+        ),
+        status.HTTP_400_BAD_REQUEST,
+    )
+
+
+@app.errorhandler(VersionConflictError)
+def version_conflict_error(error):
+    """Handles updates to a stale version of a resource"""
+    return resource_conflict(error)
+
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(error):
+    """Handles requests that ran out of time"""
+    return gateway_timeout(error)
+
+
+@app.errorhandler(PoolTimeoutError)
+def pool_timeout(error):
+    """Handles requests that could not get a database connection in time"""
+    return service_unavailable(
+        ServiceUnavailable(f"No database connection available: {error}", retry_after=app.config["ADMISSION_RETRY_AFTER"])
+    )
 
 
 @app.errorhandler(status.HTTP_400_BAD_REQUEST)
@@ -70,6 +103,17 @@ def method_not_supported(error):
     )
 
 
+@app.errorhandler(status.HTTP_409_CONFLICT)
+def resource_conflict(error):
+    """Handles conflicting requests with 409_CONFLICT"""
+    message = str(error)
+    app.logger.warning(message)
+    return (
+        jsonify(status=status.HTTP_409_CONFLICT, error="Conflict", message=message),
+        status.HTTP_409_CONFLICT,
+    )
+
+
 @app.errorhandler(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
 def mediatype_not_supported(error):
     """Handles unsupported media requests with 415_UNSUPPORTED_MEDIA_TYPE"""
@@ -85,6 +129,40 @@ def mediatype_not_supported(error):
     )
 
 
+@app.errorhandler(status.HTTP_503_SERVICE_UNAVAILABLE)
+def service_unavailable(error):
+    """Handles requests the service cannot take right now with 503_SERVICE_UNAVAILABLE"""
+    message = str(error)
+    app.logger.warning(message)
+    headers = {}
+    if getattr(error, "retry_after", None):
+        headers["Retry-After"] = str(error.retry_after)
+    return (
+        jsonify(
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            error="Service Unavailable",
+            message=message,
+        ),
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers,
+    )
+
+
+@app.errorhandler(status.HTTP_504_GATEWAY_TIMEOUT)
+def gateway_timeout(error):
+    """Handles requests that did not finish in time with 504_GATEWAY_TIMEOUT"""
+    message = str(error)
+    app.logger.warning(message)
+    return (
+        jsonify(
+            status=status.HTTP_504_GATEWAY_TIMEOUT,
+            error="Gateway Timeout",
+            message=message,
+        ),
+        status.HTTP_504_GATEWAY_TIMEOUT,
+    )
+
+
 @app.errorhandler(status.HTTP_500_INTERNAL_SERVER_ERROR)
 def internal_server_error(error):
     """Handles unexpected server error with 500_SERVER_ERROR"""
@@ -0,0 +1,88 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Group Commit
+
+This module batches writes that arrive close together so they can be
+flushed in a single transaction. The first caller in a window becomes the
+leader: it waits for the window to close (or the batch to fill), flushes
+everyone's items and hands each caller back its own result or error.
+"""
+import threading
+
+
+class _Batch:  # pylint: disable=too-few-public-methods
+    """Items collected during one commit window"""
+
+    def __init__(self):
+        self.items = []
+        self.results = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class GroupCommit:
+    """Collects concurrent writes into batches"""
+
+    def __init__(self, window: float, max_batch: int = 100):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def submit(self, item, flush):
+        """
+        Adds item to the current batch and waits for it to be flushed
+
+        Args:
+            item: the thing to write
+            flush (callable): takes a list of items and returns a list of
+                results in the same order, using an Exception instance
+                as the result for any item that failed
+
+        Returns:
+            the result of flushing item, raising it if it was an Exception
+        """
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                self._pending = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+            try:
+                batch.results = flush(batch.items)
+            except Exception as error:  # pylint: disable=broad-except
+                batch.results = [error] * len(batch.items)
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        result = batch.results[index]
+        if isinstance(result, Exception):
+            raise result
+        return result
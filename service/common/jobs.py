@@ -0,0 +1,235 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Background Jobs
+
+This module runs bulk operations on Customers off the request path. Each
+job is recorded in the job table and run by a small pool of worker
+threads, committing its progress batch by batch so that clients can poll
+GET /jobs/<id> from any worker. A job only lives in the process that
+accepted it, so every runner keeps the heartbeat of its jobs fresh and
+marks the jobs of processes that stopped as failed.
+"""
+import os
+import uuid
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+from service.models import db, Customer, Job, CUSTOMER_SCHEMA
+from service.common.tracing import tracer
+
+logger = logging.getLogger("flask.app")
+
+
+class JobQueueFull(Exception):
+    """Used when there is no room to queue another job"""
+
+
+class JobTooLarge(Exception):
+    """Used when a job would touch more rows than it may"""
+
+
+######################################################################
+# Job handlers: each gets its Job, a batch size and the most rows it may
+# touch, and returns a result
+######################################################################
+def _start(job: Job, total: int, max_rows: int) -> None:
+    """Reports the job's total, refusing it if that is more than max_rows"""
+    if total > max_rows:
+        raise JobTooLarge(f"The job would touch {total} customers, more than the {max_rows} allowed")
+    job.report(0, total)
+
+
+def import_customers(job: Job, batch_size: int, max_rows: int) -> dict:
+    """Creates the Customers in params["customers"], skipping invalid rows"""
+    rows = job.params["customers"]
+    _start(job, len(rows), max_rows)
+    created, errors = 0, []
+    for start in range(0, len(rows), batch_size):
+        # each Customer with the index of the row it came from
+        customers = []
+        for index, row in enumerate(rows[start:start + batch_size], start):
+            values, problems = CUSTOMER_SCHEMA.validate(row)
+            if problems:
+                errors.append({"index": index, "errors": problems})
+            else:
+                customers.append((index, Customer(**values)))
+        if customers:
+            results = Customer.insert_batch([customer for _, customer in customers])
+            for (index, _), row in zip(customers, results):
+                if isinstance(row, Exception):
+                    errors.append({"index": index, "errors": [str(row)]})
+                else:
+                    created += 1
+        job.report(min(start + batch_size, len(rows)))
+    return {"created": created, "failed": len(errors), "errors": errors[:100]}
+
+
+def _matching(params: dict):
+    """Returns the Customer query selected by a job's filters"""
+    return Customer.filter_membership(
+        Customer.query,
+        status=params.get("status"),
+        member_since_from=date.fromisoformat(params["member_since_from"]) if params.get("member_since_from") else None,
+        member_since_to=date.fromisoformat(params["member_since_to"]) if params.get("member_since_to") else None,
+    )
+
+
+def _pages(query, batch_size: int):
+    """Yields the Customers of a query in pages of batch_size, in id order"""
+    last = None
+    while True:
+        page = Customer.sort_by(query, "id", last).limit(batch_size).all()
+        if not page:
+            return
+        yield page
+        last = (page[-1].id,)
+
+
+def suspend_customers(job: Job, batch_size: int, max_rows: int) -> dict:
+    """Suspends the active Customers that match params"""
+    query = _matching({**job.params, "status": "active"})
+    _start(job, query.count(), max_rows)
+    suspended = 0
+    for page in _pages(query.with_entities(Customer.id), batch_size):
+        suspended += Customer.update_many(
+            [row.id for row in page], {"status": "suspended"}, event_type="customer.suspended"
+        )
+        job.report(suspended)
+    return {"suspended": suspended}
+
+
+def export_customers(job: Job, batch_size: int, max_rows: int) -> dict:
+    """Returns the Customers that match params"""
+    query = _matching(job.params)
+    _start(job, query.count(), max_rows)
+    customers = []
+    for page in _pages(query, batch_size):
+        customers.extend(customer.serialize() for customer in page)
+        job.report(len(customers))
+    return {"customers": customers}
+
+
+HANDLERS = {
+    "import": import_customers,
+    "suspend": suspend_customers,
+    "export": export_customers,
+}
+
+
+######################################################################
+# Job runner
+######################################################################
+class JobRunner:
+    """Runs jobs on a bounded pool of worker threads"""
+
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config["JOB_BATCH_SIZE"]
+        self.max_queued = app.config["JOB_MAX_QUEUED"]
+        self.max_rows = app.config["JOB_MAX_ROWS"]
+        self.heartbeat = app.config["JOB_HEARTBEAT"]
+        self.stale_after = app.config["JOB_STALE_AFTER"]
+        # unique to this process, also when a restart reuses its pid
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(app.config["JOB_WORKERS"], thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, job_id: int):
+        """
+        Queues a job to run
+
+        Raises:
+            JobQueueFull: if max_queued jobs are already waiting or running
+        """
+        with self._lock:
+            if len(self._futures) >= self.max_queued:
+                raise JobQueueFull(f"{len(self._futures)} jobs are already queued")
+            future = self._executor.submit(self.run, job_id)
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future) -> None:
+        """Forgets a finished job"""
+        with self._lock:
+            self._futures.discard(future)
+
+    def run(self, job_id: int) -> None:
+        """Runs a job, recording whether it succeeded"""
+        with self.app.app_context(), tracer.span("job", **{"job.id": job_id}):
+            job = Job.find(job_id)
+            job.start()
+            logger.info("Running %s job %s", job.kind, job.id)
+            try:
+                result = HANDLERS[job.kind](job, self.batch_size, self.max_rows)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Job %s failed", job_id)
+                db.session.rollback()
+                job.finish(error=str(error))
+            else:
+                job.finish(result)
+                logger.info("Job %s succeeded", job_id)
+
+    def beat(self) -> int:
+        """
+        Marks the jobs of this runner as alive and those of stopped ones as failed
+
+        Returns:
+            int: the number of jobs found lost
+        """
+        with self.app.app_context():
+            Job.beat(self.worker)
+            lost = Job.fail_lost(self.stale_after)
+        if lost:
+            logger.warning("Marked %d jobs of stopped workers as failed", lost)
+        return lost
+
+    def keep_alive(self) -> None:
+        """Beats every heartbeat seconds until stopped, starting right away"""
+        while True:
+            try:
+                self.beat()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Job heartbeat failed: %s", error)
+            if self._stop.wait(self.heartbeat):
+                return
+
+    def start(self):
+        """Runs the heartbeat in a background thread, unless it is turned off"""
+        if self.heartbeat:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.keep_alive, name="job-heartbeat", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the heartbeat"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def wait(self, timeout: float = None) -> None:
+        """Waits for the queued jobs to finish"""
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures, timeout)
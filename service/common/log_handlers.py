@@ -20,17 +20,57 @@ Log Handlers
 This module contains utility functions to set up logging
 consistently
 """
+import atexit
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from flask import has_request_context
+
+
+class SamplingFilter(logging.Filter):
+    """Passes only every Nth low-level record emitted while serving a request
+
+    Warnings and errors, and anything logged outside of a request (startup,
+    CLI commands), always pass.
+    """
+
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate == 1 or record.levelno >= logging.WARNING or not has_request_context():
+            return True
+        with self._lock:
+            self._count += 1
+            return self._count % self.rate == 0
 
 
 def init_logging(app, logger_name: str):
-    """Set up logging for production"""
+    """Set up logging for production
+
+    Records are handed to a queue on the request thread and written by a
+    background listener, so slow handlers never block a request.
+    """
     app.logger.propagate = False
     gunicorn_logger = logging.getLogger(logger_name)
-    app.logger.handlers = gunicorn_logger.handlers
+    handlers = gunicorn_logger.handlers
     app.logger.setLevel(gunicorn_logger.level)
     # Make all log formats consistent
     formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s", "%Y-%m-%d %H:%M:%S %z")
-    for handler in app.logger.handlers:
+    for handler in handlers:
         handler.setFormatter(formatter)
+
+    log_queue = SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(app.config.get("LOG_SAMPLE_RATE", 1)))
+    app.logger.handlers = [queue_handler]
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    app.extensions["log_listener"] = listener
     app.logger.info("Logging handler established")
@@ -0,0 +1,135 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Outbox Dispatcher
+
+This module delivers the events written to the outbox table to an HTTP sink
+in batches. Delivered events are deleted. A batch the sink does not accept
+stays in the outbox and is retried with exponential backoff, waiting at
+least as long as the sink asks for with Retry-After.
+"""
+import json
+import logging
+import threading
+import urllib.request
+from urllib.error import HTTPError, URLError
+from service.models import db, OutboxEvent
+from service.common.tracing import tracer
+
+logger = logging.getLogger("flask.app")
+
+
+class DeliveryError(Exception):
+    """Used when the sink does not accept a batch of events"""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def deliver(url: str, events: list, timeout: float) -> None:
+    """POSTs a batch of events to the sink as {"events": [...]}"""
+    body = json.dumps({"events": [event.serialize() for event in events]}).encode()
+    headers = {"Content-Type": "application/json"}
+    traceparent = tracer.traceparent()
+    if traceparent:
+        headers["traceparent"] = traceparent
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    except HTTPError as error:
+        retry_after = error.headers.get("Retry-After", "0")
+        raise DeliveryError(
+            f"Sink returned {error.code}", float(retry_after) if retry_after.isdigit() else 0
+        ) from error
+    except (URLError, OSError) as error:
+        raise DeliveryError(f"Sink is unreachable: {error}") from error
+
+
+class OutboxDispatcher:
+    """Drains the outbox to the configured sink"""
+
+    def __init__(self, app):
+        self.app = app
+        self.url = app.config["OUTBOX_SINK_URL"]
+        self.batch_size = app.config["OUTBOX_BATCH_SIZE"]
+        self.interval = app.config["OUTBOX_POLL_INTERVAL"]
+        self.timeout = app.config["OUTBOX_TIMEOUT"]
+        self.max_backoff = app.config["OUTBOX_MAX_BACKOFF"]
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def dispatch_once(self) -> int:
+        """
+        Delivers the oldest batch of events
+
+        Returns:
+            int: the number of events delivered
+        """
+        with self.app.app_context(), tracer.span("outbox.dispatch"):
+            events = OutboxEvent.claim_batch(self.batch_size)
+            ids = [event.id for event in events]
+            try:
+                if events:
+                    deliver(self.url, events, self.timeout)
+                    OutboxEvent.query.filter(OutboxEvent.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+            except DeliveryError:
+                db.session.rollback()
+                OutboxEvent.query.filter(OutboxEvent.id.in_(ids)).update(
+                    {OutboxEvent.attempts: OutboxEvent.attempts + 1}, synchronize_session=False
+                )
+                db.session.commit()
+                raise
+            logger.debug("Delivered %d outbox events", len(ids))
+            return len(ids)
+
+    def next_delay(self, delivered: int, error: Exception = None) -> float:
+        """Returns how long to wait before the next batch"""
+        if error is not None:
+            self.failures += 1
+            backoff = min(self.interval * 2**self.failures, self.max_backoff)
+            return max(backoff, getattr(error, "retry_after", 0))
+        self.failures = 0
+        # a full batch means there is more waiting, so go again right away
+        return 0 if delivered >= self.batch_size else self.interval
+
+    def run(self) -> None:
+        """Delivers batches until stopped"""
+        logger.info("Outbox dispatcher delivering to %s", self.url)
+        while not self._stop.is_set():
+            try:
+                delay = self.next_delay(self.dispatch_once())
+            except Exception as error:  # pylint: disable=broad-except
+                delay = self.next_delay(0, error)
+                logger.warning("Outbox delivery failed, retrying in %.1fs: %s", delay, error)
+            self._stop.wait(delay)
+
+    def start(self):
+        """Runs the dispatcher in a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the background thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,75 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Readiness
+
+Tells whether this process should be sent traffic. The database must
+answer a ping, whose result is cached for READINESS_CACHE_TTL seconds so
+that frequent probes do not add load, and, when READINESS_MAX_SATURATION
+is set, the connection pool must be less busy than that.
+"""
+import time
+from sqlalchemy import text
+from flask import current_app as app  # Import Flask application
+from service.models import db
+
+
+def ping_database() -> dict:
+    """Runs SELECT 1 and reports whether and how quickly it answered"""
+    start = time.monotonic()
+    try:
+        db.session.execute(text("SELECT 1"))
+        db.session.commit()
+    except Exception as error:  # pylint: disable=broad-except
+        db.session.rollback()
+        return {"ok": False, "error": str(error)}
+    return {"ok": True, "latency_ms": round((time.monotonic() - start) * 1000, 1)}
+
+
+def pool_status() -> dict:
+    """Reports how many of the pool's connections are in use"""
+    pool = db.engine.pool
+    size = pool.size()
+    checked_out = pool.checkedout()
+    return {
+        "size": size,
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / size, 2) if size else 0,
+    }
+
+
+def check_readiness() -> tuple:
+    """
+    Checks the database and the pool
+
+    Returns:
+        tuple: (ready, a report of what was checked)
+    """
+    database = app.extensions["readiness_cache"].get_or_load("database", ping_database)
+    pool = pool_status()
+    max_saturation = app.config["READINESS_MAX_SATURATION"]
+    report = {"database": database, "pool": pool}
+    admission = app.extensions.get("admission")
+    if admission is not None:
+        report["admission"] = {
+            "in_flight": admission.in_flight,
+            "limit": int(admission.limit),
+            "rejected": admission.rejected,
+        }
+    ready = database["ok"] and not (max_saturation and pool["saturation"] >= max_saturation)
+    return ready, report
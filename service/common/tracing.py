@@ -0,0 +1,271 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Tracing
+
+This module records spans for each request, each Customer model operation
+and each SQL statement, so slow requests can be broken down by layer.
+Trace context is read from and written to W3C traceparent headers, and
+finished traces are handed to a pluggable exporter. With no exporter
+configured tracing is off and costs next to nothing.
+"""
+import functools
+import importlib
+import json
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACEPARENT = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+_current = ContextVar("current_span", default=None)
+
+
+class Span:  # pylint: disable=too-many-instance-attributes
+    """One timed operation in a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, sampled: bool, trace: list):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = {}
+        self.status = "ok"
+        self.start = time.time_ns()
+        self.end = None
+        self._trace = trace
+
+    def set_attribute(self, key: str, value) -> None:
+        """Records something about the operation"""
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        """Returns the W3C traceparent header that makes this span the parent"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        """Returns the span as a dictionary for exporters"""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": (self.end - self.start) / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+######################################################################
+# Exporters
+######################################################################
+class ConsoleExporter:
+    """Writes each finished span as a line of JSON"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def export(self, spans: list) -> None:
+        """Writes a batch of finished spans"""
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._lock:
+            self.stream.write(lines)
+            self.stream.flush()
+
+
+class FileExporter(ConsoleExporter):
+    """Appends each finished span to a file as a line of JSON"""
+
+    def __init__(self, path: str):
+        super().__init__(open(path, "a", encoding="utf-8"))  # pylint: disable=consider-using-with
+
+
+def load_exporter(spec: str):
+    """
+    Returns the exporter named by spec
+
+    "console" writes to stdout, "file:<path>" appends to a file, and
+    "package.module:factory" calls factory() for any other exporter, which
+    only needs an export(spans) method. An empty spec turns tracing off.
+    """
+    if not spec:
+        return None
+    if spec == "console":
+        return ConsoleExporter()
+    if spec.startswith("file:"):
+        return FileExporter(spec[len("file:"):])
+    module, _, factory = spec.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+
+######################################################################
+# Tracer
+######################################################################
+class Tracer:
+    """Starts spans and exports each trace once its local root span ends"""
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_span(self, name: str, traceparent: str = None, **attributes) -> tuple:
+        """
+        Starts a span as a child of the current span, or of the remote
+        parent in traceparent when there is no current span
+
+        Returns:
+            tuple: (span, token) to pass to end_span(), or (None, None)
+            when tracing is off
+        """
+        if self.exporter is None:
+            return None, None
+        parent = _current.get()
+        if parent is not None:
+            # pylint: disable=protected-access
+            span = Span(name, parent.trace_id, parent.span_id, parent.sampled, parent._trace)
+        else:
+            match = TRACEPARENT.fullmatch(traceparent or "")
+            if match and match.group(1) != "0" * 32:
+                span = Span(name, match.group(1), match.group(2), bool(int(match.group(3), 16) & 1), [])
+            else:
+                span = Span(name, secrets.token_hex(16), None, random.random() < self.sample_rate, [])
+        span.attributes.update(attributes)
+        return span, _current.set(span)
+
+    def end_span(self, span: Span, token, error: BaseException = None) -> None:
+        """Ends a span, exporting its trace if it was the local root"""
+        if span is None:
+            return
+        span.end = time.time_ns()
+        if error is not None:
+            span.status = "error"
+            span.set_attribute("error", repr(error))
+        _current.reset(token)
+        trace = span._trace  # pylint: disable=protected-access
+        trace.append(span)
+        if _current.get() is None and span.sampled:
+            self.exporter.export(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Runs the body of a with statement in a span"""
+        span, token = self.start_span(name, **attributes)
+        try:
+            yield span
+        except BaseException as error:
+            self.end_span(span, token, error)
+            raise
+        self.end_span(span, token)
+
+    @staticmethod
+    def traceparent():
+        """Returns the traceparent header for outgoing calls, or None"""
+        span = _current.get()
+        return span.traceparent if span is not None else None
+
+
+tracer = Tracer()
+
+
+def traced(name: str):
+    """Decorates a function so each call runs in a span called name"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if tracer.exporter is None:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+######################################################################
+# Flask and SQLAlchemy instrumentation
+######################################################################
+def init_tracing(app, engine) -> None:
+    """
+    Traces the requests to app and the SQL statements run on engine
+
+    The hooks are always installed and do nothing while tracer has no
+    exporter, so an exporter can be set later, e.g. by tests.
+    """
+    tracer.exporter = load_exporter(app.config.get("TRACING_EXPORTER"))
+    tracer.sample_rate = app.config.get("TRACING_SAMPLE_RATE", 1.0)
+    # pylint: disable=import-outside-toplevel
+    from flask import g, request
+    from sqlalchemy import event
+
+    @app.before_request
+    def start_request_span():
+        if tracer.exporter is None:
+            return
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.trace_span = tracer.start_span(
+            f"{request.method} {rule}",
+            traceparent=request.headers.get("traceparent"),
+            **{"http.method": request.method, "http.route": rule},
+        )
+
+    @app.after_request
+    def record_response(response):
+        span, _ = g.get("trace_span", (None, None))
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers["traceresponse"] = span.traceparent
+        return response
+
+    @app.teardown_request
+    def end_request_span(error=None):
+        span, token = g.pop("trace_span", (None, None))
+        tracer.end_span(span, token, error)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_statement_span(_conn, _cursor, statement, _parameters, context, _executemany):
+        if tracer.exporter is None or context is None:
+            return
+        verb = statement.split(None, 1)[0].upper() if statement.strip() else "SQL"
+        context.trace_span = tracer.start_span(f"db {verb}", **{"db.statement": statement})
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_statement_span(_conn, _cursor, _statement, _parameters, context, _executemany):
+        tracer.end_span(*_pop_statement_span(context))
+
+    @event.listens_for(engine, "handle_error")
+    def fail_statement_span(exception_context):
+        span, token = _pop_statement_span(exception_context.execution_context)
+        tracer.end_span(span, token, exception_context.original_exception)
+
+
+def _pop_statement_span(context) -> tuple:
+    """Takes the span started for a statement off its execution context"""
+    span = getattr(context, "trace_span", (None, None))
+    if context is not None and span[0] is not None:
+        context.trace_span = (None, None)
+    return span
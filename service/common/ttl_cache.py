@@ -0,0 +1,60 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+TTL Cache
+
+This module keeps recently computed results for a short time so that
+repeated requests for the same expensive result can share it
+"""
+import threading
+import time
+
+
+class TTLCache:
+    """A small, thread-safe cache whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl: float = 0, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, calling loader() to compute it
+        when it is missing or has expired. A ttl of 0 turns caching off.
+        """
+        if self.ttl <= 0:
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        value = loader()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+            if len(self._entries) < self.max_entries:
+                self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self) -> None:
+        """Forgets every cached value"""
+        with self._lock:
+            self._entries.clear()
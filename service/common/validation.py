@@ -0,0 +1,111 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Validation
+
+This module checks request payloads against a declarative schema. Each
+field is compiled once into a small check function, so validating a
+payload is a single pass over its fields that reports every problem at
+once instead of stopping at the first one.
+"""
+import re
+from datetime import date
+
+EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+# digits with optional +, spaces, (), . and - separators and an extension
+PHONE = re.compile(r"(?=(?:\D*\d){3})\+?[0-9 ().-]+(?: ?(?:x|ext\.?) ?[0-9]+)?")
+
+
+class Field:  # pylint: disable=too-few-public-methods
+    """Describes one field of a payload"""
+
+    def __init__(self, name: str, *, required: bool = True, min_length: int = 0,
+                 max_length: int = None, pattern: re.Pattern = None, is_date: bool = False):
+        self.name = name
+        self.required = required
+        self.min_length = min_length
+        self.max_length = max_length
+        self.pattern = pattern
+        self.is_date = is_date
+
+    def compile(self):
+        """
+        Returns a function that checks a value of this field
+
+        The function returns (value, None) for a good value, converting
+        dates from ISO strings, and (None, message) for a bad one.
+        """
+        name, min_length, max_length = self.name, self.min_length, self.max_length
+        match = self.pattern.fullmatch if self.pattern else None
+        convert = date.fromisoformat if self.is_date else None
+        kind = "date" if self.is_date else "string"
+
+        def check(value):
+            if not isinstance(value, str):
+                return None, f"{name} must be a {kind}"
+            if len(value) < min_length:
+                return None, f"{name} must not be empty"
+            if max_length is not None and len(value) > max_length:
+                return None, f"{name} must be at most {max_length} characters"
+            if match is not None and match(value) is None:
+                return None, f"{name} is not a valid {name.replace('_', ' ')}"
+            if convert is not None:
+                try:
+                    return convert(value), None
+                except ValueError:
+                    return None, f"{name} must be a date in YYYY-MM-DD format"
+            return value, None
+
+        return check
+
+
+class Schema:
+    """A compiled set of fields to validate payloads against"""
+
+    def __init__(self, *fields: Field):
+        self.fields = fields
+        self._checks = [(field.name, field.required, field.compile()) for field in fields]
+
+    def validate(self, data, partial: bool = False) -> tuple:
+        """
+        Validates a payload
+
+        Fields that are not in the schema are ignored.
+
+        Args:
+            data (dict): the payload to check
+            partial (bool): only check the fields that are present
+
+        Returns:
+            tuple: (values, errors) where values holds the converted good
+            fields and errors lists a message for each problem found
+        """
+        if not isinstance(data, dict):
+            return {}, ["body of request must be a JSON object"]
+        values = {}
+        errors = []
+        for name, required, check in self._checks:
+            if name not in data:
+                if required and not partial:
+                    errors.append(f"missing {name}")
+                continue
+            value, error = check(data[name])
+            if error is None:
+                values[name] = value
+            else:
+                errors.append(error)
+        return values, errors
@@ -15,6 +15,108 @@ SQLALCHEMY_DATABASE_URI = DATABASE_URI
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 # SQLALCHEMY_POOL_SIZE = 2
 
+# Timeouts, in seconds (0 = none): the longest any statement may run, the
+# deadline of each endpoint named in ROUTE_TIMEOUTS ("endpoint=seconds,..."),
+# which defaults to STATEMENT_TIMEOUT, and how long a request may wait for
+# a pooled connection
+STATEMENT_TIMEOUT = float(os.getenv("STATEMENT_TIMEOUT", "30"))
+ROUTE_TIMEOUTS = {
+    endpoint.strip(): float(seconds)
+    for endpoint, _, seconds in (
+        item.partition("=")
+        for item in os.getenv("ROUTE_TIMEOUTS", "list_customers=5,readiness_check=1").split(",")
+        if item.strip()
+    )
+}
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+# psycopg prepares a statement on the server once it has run this many times
+# on a connection, so Postgres skips parsing and planning it after that. Set
+# it to "off" behind PgBouncer in transaction pooling mode, where a prepared
+# statement may not exist on the next server connection
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD", "1")
+
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "connect_args": {
+        "prepare_threshold": None if DB_PREPARE_THRESHOLD.lower() in ("off", "none", "") else int(DB_PREPARE_THRESHOLD)
+    },
+}
+
+# Group commit: batch concurrent creates arriving within this many seconds
+# into one transaction (0 = commit every create on its own)
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW", "0"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "100"))
+
+# Responses to POST /customers with an Idempotency-Key are replayed for
+# retries with the same key for this many seconds
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+# Compress responses of at least COMPRESSION_MIN_SIZE bytes when the client
+# accepts it; COMPRESSION_LEVEL trades CPU for bandwidth (1 = fastest) and is
+# capped at what each encoding allows (gzip 9, brotli 11, zstd 22)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+# GET /customers/stats results are reused for this many seconds (0 = never)
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "0"))
+
+# The change feed only reports changes older than this many seconds, so
+# transactions that are still committing are not skipped by a cursor
+CHANGE_FEED_LAG = float(os.getenv("CHANGE_FEED_LAG", "5"))
+
+# Transactional outbox: record customer events alongside each change and,
+# when a sink is configured, deliver them there in batches
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+OUTBOX_SINK_URL = os.getenv("OUTBOX_SINK_URL")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_TIMEOUT = float(os.getenv("OUTBOX_TIMEOUT", "10"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "60"))
+
+# Background jobs: worker threads per process, how many jobs may wait for
+# one, rows per transaction, and the most customers a single import,
+# suspend or export may touch (bigger ones are refused)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "500"))
+JOB_MAX_ROWS = int(os.getenv("JOB_MAX_ROWS", "100000"))
+
+# Job heartbeats: how often each process marks the jobs it holds as alive
+# (0 for never), and how long a job may go without one before it is
+# marked failed because its worker stopped
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", "10"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "60"))
+
+# Tracing: where spans go ("console", "file:<path>", "module:factory" or ""
+# for off) and the fraction of requests that are traced
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1"))
+
+# Admission control: each worker runs at most ADMISSION_MAX_CONCURRENCY
+# database-bound requests at once (0 = no limit) and turns away those that
+# wait longer than ADMISSION_MAX_WAIT seconds for a slot. A non-zero target
+# latency lets the limit shrink, down to ADMISSION_MIN_CONCURRENCY, while
+# requests are slower than that
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "5"))
+ADMISSION_MIN_CONCURRENCY = int(os.getenv("ADMISSION_MIN_CONCURRENCY", "1"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "0.1"))
+ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", "0"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# GET /ready reuses its database ping for READINESS_CACHE_TTL seconds and,
+# when READINESS_MAX_SATURATION is set, reports not ready while at least
+# that fraction of the connection pool is in use
+READINESS_CACHE_TTL = float(os.getenv("READINESS_CACHE_TTL", "2"))
+READINESS_MAX_SATURATION = float(os.getenv("READINESS_MAX_SATURATION", "0"))
+
+# Static assets are served under content-hashed URLs that browsers may
+# cache for this many seconds without asking again
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", "31536000"))
+
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "sup3r-s3cr3t")
 LOGGING_LEVEL = logging.INFO
+# Only every Nth per-request INFO message is written (1 = log everything)
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "1"))
@@ -3,64 +3,387 @@ Models for Customer
 
 All of the models are stored in this module
 """
+# pylint: disable=too-many-lines
 import os
 import logging
-from datetime import date
+from datetime import date, timedelta
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import any_, bindparam, delete, event, inspect, insert, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from service.common.deadlines import DeadlineExceeded
+from service.common.singleflight import SingleFlight
+from service.common.tracing import traced
+from service.common.validation import EMAIL, PHONE, Field, Schema
 
 # global variables for retry as discussed in lab
 RETRY_COUNT = int(os.environ.get("RETRY_COUNT", 5))
 RETRY_DELAY = int(os.environ.get("RETRY_DELAY", 1))
 RETRY_BACKOFF = int(os.environ.get("RETRY_BACKOFF", 2))
 
+# Declarative partitioning of the customer table: "range" partitions it by
+# member_since, "hash" by id, and anything else leaves it unpartitioned.
+# Only takes effect when the table is created.
+PARTITION_BY = os.environ.get("CUSTOMER_PARTITION_BY", "").lower()
+HASH_PARTITIONS = int(os.environ.get("CUSTOMER_HASH_PARTITIONS", 8))
+# The first member_since month that range partitioning gives a partition of
+# its own when the table is created (YYYY-MM-DD, empty for this month)
+PARTITION_START = os.environ.get("CUSTOMER_PARTITION_START", "")
+PARTITION_CLAUSES = {"range": "RANGE (member_since)", "hash": "HASH (id)"}
+
 logger = logging.getLogger("flask.app")
 
 # Create the SQLAlchemy object to be initialized later in init_db()
 db = SQLAlchemy()
 
+# Concurrent identical reads within this worker share one database call
+reads = SingleFlight()
+
+# Failures that say nothing about the data, so writes pass them on as they
+# are for the error handlers to answer with 504 or 503 instead of 400
+UNAVAILABLE_ERRORS = (DeadlineExceeded, PoolTimeoutError)
+
 
 class DataValidationError(Exception):
     """Used for an data validation errors when deserializing"""
 
+    def __init__(self, message, errors: list = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class VersionConflictError(Exception):
+    """Used when a Customer was changed by someone else since it was read"""
+
+
+class IdempotencyKeyTaken(Exception):
+    """Used when another request already created a Customer with the same Idempotency-Key"""
+
+
+class CustomerTombstone(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Remembers a deleted Customer so the change feed can report the delete
+    """
+
+    __tablename__ = "customer_tombstone"
+    __table_args__ = (db.Index("ix_customer_tombstone_deleted_at_id", "deleted_at", "id"),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    deleted_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+
+
+class OutboxEvent(db.Model):
+    """
+    A domain event written in the same transaction as the change it describes,
+    waiting to be delivered to other services
+    """
+
+    __tablename__ = "outbox_event"
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    event_type = db.Column(db.String(32), nullable=False)
+    customer_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def enabled() -> bool:
+        """Returns True if changes should be written to the outbox"""
+        return bool(current_app.config.get("OUTBOX_ENABLED"))
+
+    @classmethod
+    def record(cls, event_type: str, customer_id: int, payload: dict) -> None:
+        """Adds an event to the outbox in the current transaction"""
+        db.session.add(cls(event_type=event_type, customer_id=customer_id, payload=payload))
+
+    @classmethod
+    def claim_batch(cls, limit: int) -> list:
+        """Locks the oldest undelivered events for delivery
+
+        Events locked by another dispatcher are skipped, so several
+        dispatchers can drain the outbox at once.
+        """
+        return cls.query.order_by(cls.id).limit(limit).with_for_update(skip_locked=True).all()
+
+    def serialize(self) -> dict:
+        """Serializes an OutboxEvent into a dictionary"""
+        return {
+            "id": self.id,
+            "type": self.event_type,
+            "customer_id": self.customer_id,
+            "payload": self.payload,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class IdempotencyKey(db.Model):
+    """
+    The Customer created by a POST /customers sent with an Idempotency-Key
+
+    Claimed before the Customer is inserted and filled in by the same
+    transaction, so that a retry is answered from it by any worker, also
+    after a restart, and a concurrent request with the same key waits for
+    the first one before it writes anything
+    """
+
+    __tablename__ = "idempotency_key"
+
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # only empty inside the transaction that claimed the key
+    customer_id = db.Column(db.Integer)
+    response = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+
+    @staticmethod
+    def cutoff():
+        """Returns the SQL for when keys that are still kept were created at the earliest"""
+        return db.func.now() - timedelta(seconds=current_app.config["IDEMPOTENCY_TTL"])
+
+    @classmethod
+    def find(cls, key: str):
+        """Returns the record of key if it has not expired"""
+        return db.session.scalars(select(cls).where(cls.key == key, cls.created_at > cls.cutoff())).first()
+
+    @classmethod
+    def claim(cls, key: str, fingerprint: str) -> bool:
+        """
+        Records key in the current transaction, replacing an expired record
+
+        A concurrent transaction that claimed the same key is waited for.
+
+        Returns:
+            bool: False if that transaction committed, so the key is taken
+        """
+        statement = pg_insert(cls).values(key=key, fingerprint=fingerprint, created_at=db.func.now())
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.key],
+            set_={
+                "fingerprint": statement.excluded.fingerprint,
+                "customer_id": None,
+                "response": None,
+                "created_at": statement.excluded.created_at,
+            },
+            where=cls.created_at <= cls.cutoff(),
+        ).returning(cls.key)
+        return db.session.execute(statement).first() is not None
+
+    @classmethod
+    def fill(cls, key: str, customer_id: int, response: dict) -> None:
+        """Records the Customer created for a key claimed in the current transaction"""
+        db.session.execute(update(cls).where(cls.key == key).values(customer_id=customer_id, response=response))
+
+
+class Job(db.Model):
+    """
+    A long-running bulk operation that runs in the background, recording
+    its progress and result so clients can poll for them
+
+    The JobRunner holding a job keeps its heartbeat_at fresh, so a job left
+    behind by a worker that stopped can be told apart and marked failed
+    """
+
+    LOST = "The worker running the job stopped"
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="queued")
+    params = db.Column(db.JSON, nullable=False)
+    total = db.Column(db.Integer)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    worker = db.Column(db.String(128))
+    heartbeat_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+
+    @classmethod
+    def create(cls, kind: str, params: dict, worker: str = None):
+        """Records a new queued Job held by worker and commits it"""
+        job = cls(kind=kind, params=params, status="queued", processed=0, worker=worker)
+        db.session.add(job)
+        db.session.commit()
+        logger.info("Queued %s job %s", kind, job.id)
+        return job
+
+    @classmethod
+    def find(cls, by_id):
+        """Finds a Job by its ID, always reading its latest progress"""
+        return db.session.get(cls, by_id, populate_existing=True)
+
+    @classmethod
+    def beat(cls, worker: str) -> None:
+        """Marks the unfinished Jobs held by worker as still alive"""
+        db.session.execute(
+            update(cls)
+            .where(cls.worker == worker, cls.status.in_(("queued", "running")))
+            .values(heartbeat_at=db.func.now())
+        )
+        db.session.commit()
+
+    @classmethod
+    def fail_lost(cls, stale_after: float) -> int:
+        """
+        Marks the unfinished Jobs without a heartbeat for stale_after seconds as failed
+
+        Returns:
+            int: the number of Jobs that were lost
+        """
+        result = db.session.execute(
+            update(cls)
+            .where(
+                cls.status.in_(("queued", "running")),
+                cls.heartbeat_at < db.func.now() - timedelta(seconds=stale_after),
+            )
+            .values(status="failed", error=cls.LOST, finished_at=db.func.now())
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def start(self) -> None:
+        """Marks the Job as running"""
+        self.status = "running"
+        self.started_at = db.func.now()
+        db.session.commit()
+
+    def report(self, processed: int, total: int = None) -> None:
+        """Commits the progress made so far"""
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        db.session.commit()
 
-class Customer(db.Model):
+    def finish(self, result: dict = None, error: str = None) -> None:
+        """Marks the Job as succeeded with a result, or failed with an error"""
+        self.status = "failed" if error else "succeeded"
+        self.result = result
+        self.error = error
+        self.finished_at = db.func.now()
+        db.session.commit()
+
+    def serialize(self) -> dict:
+        """Serializes a Job into a dictionary"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class Customer(db.Model):  # pylint: disable=too-many-public-methods
     """
     Class that represents a Customer
     """
 
+    # Lets the change feed and sorted listings walk the table in index
+    # order, and lets status and member_since filters use range scans. Most customers
+    # are active, so only the others are worth indexing by status.
+    __table_args__ = (
+        db.Index("ix_customer_last_updated_id", "last_updated", "id"),
+        db.Index("ix_customer_member_since_id", "member_since", "id"),
+        db.Index("ix_customer_name_id", "name", "id"),
+        db.Index(
+            "ix_customer_status_member_since",
+            "status",
+            "member_since",
+            postgresql_where=text("status <> 'active'"),
+        ),
+        {"postgresql_partition_by": PARTITION_CLAUSES[PARTITION_BY]} if PARTITION_BY in PARTITION_CLAUSES else {},
+    )
+
     ##################################################
     # Table Schema
     ##################################################
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(63), nullable=False)
     address = db.Column(db.String(256), nullable=False)
     email = db.Column(db.String(63), nullable=False)
     phone_number = db.Column(db.String(32), nullable=False)
-    member_since = db.Column(db.Date(), nullable=False, default=date.today())
+    # A range partitioned table needs its partition key in the primary key
+    member_since = db.Column(
+        db.Date(), nullable=False, default=date.today(), primary_key=PARTITION_BY == "range"
+    )
     # Database auditing fields
     created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
     last_updated = db.Column(
         db.DateTime, default=db.func.now(), onupdate=db.func.now(), nullable=False
     )
     status = db.Column(db.String(20), nullable=False, default="active")
+    # Optimistic concurrency: bumped by every update
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    # Customers are always identified by id alone
+    __mapper_args__ = {"primary_key": [id]}
+
+    # Fields a client sets through deserialize()
+    FIELDS = ("name", "address", "email", "phone_number", "member_since")
+
+    # Indexed columns listings can be sorted by, with id breaking ties
+    SORTABLE = ("id", "name", "member_since", "last_updated")
+
+    # How stats() can bucket sign-ups by member_since
+    STATS_BUCKETS = ("day", "week", "month")
 
     def __repr__(self):
         return f"<Customer {self.name} id=[{self.id}]>"
 
-    def create(self):
+    @traced("Customer.create")
+    def create(self, idempotency: tuple = None):
         """
         Creates a Customer to the database
+
+        Args:
+            idempotency (tuple): the (Idempotency-Key, fingerprint) of the
+                request, recorded along with the new Customer
+
+        Raises:
+            IdempotencyKeyTaken: if another request already used the key
         """
         logger.info("Creating %s", self.name)
         self.id = None  # pylint: disable=invalid-name
+        group_commit = current_app.extensions.get("group_commit")
+        # the key has to be written in the Customer's own transaction
+        if group_commit and not idempotency:
+            self._load(group_commit.submit(self, Customer.insert_batch))
+            return
+        # INSERT ... RETURNING every column, so the new Customer does not
+        # have to be read back after the commit
+        statement = insert(Customer).values(**self.insert_values()).returning(*self.__table__.columns)
         try:
-            db.session.add(self)
+            # the key is claimed first, so a duplicate gives up before it
+            # writes a Customer
+            if idempotency and not IdempotencyKey.claim(*idempotency):
+                raise IdempotencyKeyTaken(f"Idempotency-Key {idempotency[0]} was used by another request")
+            row = db.session.execute(statement).one()
+            if OutboxEvent.enabled():
+                OutboxEvent.record("customer.created", row.id, Customer(**row._mapping).serialize())
+            if idempotency:
+                IdempotencyKey.fill(idempotency[0], row.id, Customer(**row._mapping).serialize())
             db.session.commit()
         except Exception as e:
             db.session.rollback()
+            if isinstance(e, (IdempotencyKeyTaken, *UNAVAILABLE_ERRORS)):
+                raise
             logger.error("Error creating record: %s", self)
             raise DataValidationError(e) from e
+        self._load(row)
 
+    @traced("Customer.update")
     def update(self) -> None:
         """
         Updates a Customer to the database
@@ -69,23 +392,55 @@ class Customer(db.Model):
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
         try:
+            self.version = Customer.version + 1
+            if OutboxEvent.enabled():
+                db.session.flush()
+                OutboxEvent.record("customer.updated", self.id, self.serialize())
             db.session.commit()
         except Exception as e:
             db.session.rollback()
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                raise
             logger.error("Error updating record: %s", self)
             raise DataValidationError(e) from e
 
+    @traced("Customer.delete")
     def delete(self):
         """Removes a Customer from the data store"""
         logger.info("Deleting %s", self.name)
         try:
             db.session.delete(self)
+            db.session.add(CustomerTombstone(id=self.id))
+            if OutboxEvent.enabled():
+                OutboxEvent.record("customer.deleted", self.id, {"id": self.id})
             db.session.commit()
         except Exception as e:
             db.session.rollback()
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                raise
             logger.error("Error deleting record: %s", self)
             raise DataValidationError(e) from e
 
+    def _load(self, row) -> None:
+        """Makes this Customer persistent using a row returned by INSERT"""
+        for key, value in row._mapping.items():
+            setattr(self, key, value)
+        make_transient_to_detached(self)
+        db.session.add(self)
+
+    def insert_values(self) -> dict:
+        """Returns the column values to INSERT, applying Python-side defaults"""
+        values = {}
+        for column in self.__table__.columns:
+            value = getattr(self, column.key)
+            if value is None and column.default is not None:
+                if not column.default.is_scalar:
+                    continue  # let the database fill it in
+                value = column.default.arg
+            if column.key != "id":  # the database assigns ids
+                values[column.key] = value
+        return values
+
     def serialize(self):
         """Serializes a Customer into a dictionary"""
         return {
@@ -96,6 +451,7 @@ class Customer(db.Model):
             "phone_number": self.phone_number,
             "member_since": self.member_since.isoformat(),
             "status": self.status,
+            "version": self.version,
         }
 
     def deserialize(self, data):
@@ -105,87 +461,569 @@ class Customer(db.Model):
         Args:
             data (dict): A dictionary containing the resource data
         """
-        try:
-            self.name = data["name"]
-            self.address = data["address"]
-            self.email = data["email"]
-            self.phone_number = data["phone_number"]
-            self.member_since = date.fromisoformat(data["member_since"])
-        except AttributeError as error:
-            raise DataValidationError("Invalid attribute: " + error.args[0]) from error
-        except KeyError as error:
-            raise DataValidationError(
-                "Invalid Customer: missing " + error.args[0]
-            ) from error
-        except TypeError as error:
-            raise DataValidationError(
-                "Invalid Customer: body of request contained bad or no data "
-                + str(error)
-            ) from error
+        values = validate_customer(data)
+        for field, value in values.items():
+            setattr(self, field, value)
         return self
 
+    @classmethod
+    def deserialize_fields(cls, data) -> dict:
+        """
+        Validates just the Customer fields present in a dictionary
+
+        Args:
+            data (dict): A dictionary containing some of the resource data
+
+        Returns:
+            dict: the supplied fields, ready to pass to update_by_id()
+        """
+        return validate_customer(data, partial=True)
+
     ##################################################
     # CLASS METHODS
     ##################################################
 
     @classmethod
+    def from_row(cls, row):
+        """Returns the Customer for a row returned by the database
+
+        The Customer is merged into the session fully loaded, so reading it
+        never triggers another SELECT.
+        """
+        customer = cls(**row._mapping)
+        make_transient_to_detached(customer)
+        return db.session.merge(customer, load=False)
+
+    @classmethod
+    @traced("Customer.update_by_id")
+    def update_by_id(  # pylint: disable=too-many-arguments
+        cls, by_id, values: dict, version: int = None, event_type: str = "customer.updated", member_since: date = None
+    ):
+        """Updates a Customer with a single UPDATE ... RETURNING statement
+
+        Args:
+            by_id (int): the id of the Customer to update
+            values (dict): the columns to change
+            version (int): if given, only update the Customer if it is still
+                at this version
+            event_type (str): the outbox event to record for the change
+            member_since (date): the Customer's current member_since, if
+                known, so a range partitioned table looks in one partition
+
+        Returns:
+            Customer: the updated Customer, or None if there is no such id
+        """
+        logger.info("Updating id %s with %s", by_id, list(values))
+        table = cls.__table__
+        statement = update(table).where(cls.by_id(by_id, member_since))
+        if version is not None:
+            statement = statement.where(table.c.version == version)
+        statement = statement.values(**values, version=table.c.version + 1).returning(*table.columns)
+        try:
+            row = db.session.execute(statement).first()
+            if row is not None and OutboxEvent.enabled():
+                OutboxEvent.record(event_type, by_id, cls(**row._mapping).serialize())
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                raise
+            logger.error("Error updating record: %s", by_id)
+            raise DataValidationError(e) from e
+
+        if row is not None:
+            return cls.from_row(row)
+        if version is not None and db.session.execute(select(table.c.id).where(cls.by_id(by_id, member_since))).first():
+            raise VersionConflictError(f"Customer with id '{by_id}' is no longer at version {version}")
+        return None
+
+    @classmethod
+    @traced("Customer.update_many")
+    def update_many(cls, ids: list, values: dict, event_type: str = "customer.updated") -> int:
+        """Updates several Customers with a single UPDATE ... RETURNING statement
+
+        Args:
+            ids (list): the ids of the Customers to update
+            values (dict): the columns to change
+            event_type (str): the outbox event to record for each change
+
+        Returns:
+            int: the number of Customers updated
+        """
+        logger.info("Updating %d ids with %s", len(ids), list(values))
+        table = cls.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == any_(bindparam("ids", ids, type_=ARRAY(db.Integer))))
+            .values(**values, version=table.c.version + 1)
+            .returning(*table.columns)
+        )
+        try:
+            rows = db.session.execute(statement).all()
+            if OutboxEvent.enabled():
+                for row in rows:
+                    OutboxEvent.record(event_type, row.id, cls(**row._mapping).serialize())
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                raise
+            logger.error("Error updating %d records", len(ids))
+            raise DataValidationError(e) from e
+        return len(rows)
+
+    @classmethod
+    @traced("Customer.delete_by_id")
+    def delete_by_id(cls, by_id, member_since: date = None) -> bool:
+        """Deletes a Customer with a single DELETE ... RETURNING statement
+
+        Args:
+            by_id (int): the id of the Customer to delete
+            member_since (date): the Customer's member_since, if known, so a
+                range partitioned table looks in one partition
+
+        Returns:
+            bool: True if a Customer was deleted
+        """
+        logger.info("Deleting id %s", by_id)
+        table = cls.__table__
+        # delete and leave a tombstone in the same round trip
+        deleted = delete(table).where(cls.by_id(by_id, member_since)).returning(table.c.id).cte("deleted")
+        statement = (
+            insert(CustomerTombstone)
+            .from_select(["id"], select(deleted.c.id))
+            .add_cte(deleted)
+            .returning(CustomerTombstone.id)
+        )
+        try:
+            row = db.session.execute(statement).first()
+            if row is not None and OutboxEvent.enabled():
+                OutboxEvent.record("customer.deleted", by_id, {"id": by_id})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                raise
+            logger.error("Error deleting record: %s", by_id)
+            raise DataValidationError(e) from e
+        return row is not None
+
+    @classmethod
+    def sort_columns(cls, sort: str) -> tuple:
+        """Returns the columns a sort such as "name" or "-member_since" orders by
+
+        Returns:
+            tuple: (columns, descending)
+        """
+        name = sort.removeprefix("-")
+        if name not in cls.SORTABLE:
+            raise DataValidationError(f"Invalid sort: {sort}, must be one of {', '.join(cls.SORTABLE)}")
+        columns = (cls.id,) if name == "id" else (getattr(cls, name), cls.id)
+        return columns, sort.startswith("-")
+
+    @classmethod
+    def sort_by(cls, query, sort: str, after: tuple = None):
+        """Orders a Customer query, starting after a keyset position
+
+        Args:
+            query (Query or Select): the Customer query to order
+            sort (str): the column to sort by, prefixed with - to descend
+            after (tuple): the values of the sort columns for the last
+                Customer seen, or None to start at the beginning
+        """
+        columns, descending = cls.sort_columns(sort)
+        if after is not None:
+            position, last = tuple_(*columns), tuple_(*after)
+            query = query.filter(position < last if descending else position > last)
+        return query.order_by(*(column.desc() if descending else column for column in columns))
+
+    @classmethod
+    @traced("Customer.stats")
+    def stats(cls, bucket: str = "month") -> dict:
+        """Returns the number of Customers per status and sign-ups per period
+
+        Both aggregates come from a single GROUP BY GROUPING SETS query.
+
+        Args:
+            bucket (str): day, week or month, the period to count sign-ups by
+
+        Returns:
+            dict: {"total": n, "by_status": {status: n}, "signups": [{"period": date, "count": n}]}
+        """
+        if bucket not in cls.STATS_BUCKETS:
+            raise DataValidationError(f"Invalid bucket: {bucket}, must be one of {', '.join(cls.STATS_BUCKETS)}")
+        logger.info("Processing stats by %s ...", bucket)
+        # bucket is one of STATS_BUCKETS, so it is safe to inline, and it has
+        # to be inlined for the SELECT and GROUP BY expressions to match
+        period = db.cast(db.func.date_trunc(db.literal_column(f"'{bucket}'"), cls.member_since), db.Date)
+        rows = db.session.execute(
+            select(cls.status, period, db.func.count())
+            .group_by(db.func.grouping_sets(cls.status, period))
+            .order_by(period)
+        ).all()
+
+        by_status = {status: count for status, first_day, count in rows if first_day is None}
+        signups = [
+            {"period": first_day.isoformat(), "count": count}
+            for status, first_day, count in rows
+            if first_day is not None
+        ]
+        return {"total": sum(by_status.values()), "by_status": by_status, "signups": signups}
+
+    @classmethod
+    @traced("Customer.changes_since")
+    def changes_since(cls, position: tuple = None, limit: int = 100, lag: float = 0) -> list:
+        """Returns the changes made after a position in the change feed
+
+        Changes are ordered by (timestamp, id). Only changes older than lag
+        seconds are returned, so transactions still in flight when a client
+        reads the feed are not skipped by its next cursor.
+
+        Args:
+            position (tuple): the (timestamp, id) of the last change seen
+            limit (int): the most changes to return
+            lag (float): seconds a change must have settled for
+
+        Returns:
+            list: (timestamp, id, Customer) tuples, with None for deletes
+        """
+        logger.info("Processing changes since %s ...", position)
+        settled = db.func.now() - timedelta(seconds=lag)
+        changed = cls.query.filter(cls.last_updated < settled)
+        deleted = CustomerTombstone.query.filter(CustomerTombstone.deleted_at < settled)
+        if position:
+            changed = changed.filter(tuple_(cls.last_updated, cls.id) > tuple_(*position))
+            deleted = deleted.filter(tuple_(CustomerTombstone.deleted_at, CustomerTombstone.id) > tuple_(*position))
+        changed = changed.order_by(cls.last_updated, cls.id).limit(limit)
+        deleted = deleted.order_by(CustomerTombstone.deleted_at, CustomerTombstone.id).limit(limit)
+
+        changes = [(customer.last_updated, customer.id, customer) for customer in changed]
+        changes += [(tombstone.deleted_at, tombstone.id, None) for tombstone in deleted]
+        changes.sort(key=lambda change: change[:2])
+        return changes[:limit]
+
+    @classmethod
+    @traced("Customer.insert_batch")
+    def insert_batch(cls, customers: list) -> list:
+        """Inserts several Customers in a single transaction
+
+        The whole batch is tried as one multi-row INSERT. If that fails, each
+        Customer is retried in its own savepoint so only the bad rows fail.
+
+        Returns:
+            list: the inserted row, or a DataValidationError, per Customer
+        """
+        logger.info("Group commit of %d Customers", len(customers))
+        statement = insert(cls).returning(*cls.__table__.columns, sort_by_parameter_order=True)
+        values = [customer.insert_values() for customer in customers]
+        try:
+            try:
+                with db.session.begin_nested():
+                    results = db.session.execute(statement, values).all()
+            except SQLAlchemyError:
+                results = [cls._insert_one(statement, row) for row in values]
+            if OutboxEvent.enabled():
+                for row in results:
+                    if not isinstance(row, Exception):
+                        OutboxEvent.record("customer.created", row.id, cls(**row._mapping).serialize())
+            db.session.commit()
+        except Exception as e:  # pylint: disable=broad-except
+            db.session.rollback()
+            logger.error("Error committing batch of %d records", len(customers))
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                return [e] * len(customers)
+            return [DataValidationError(e)] * len(customers)
+        return results
+
+    @classmethod
+    def _insert_one(cls, statement, values: dict):
+        """Inserts a single row inside a savepoint"""
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(statement, [values]).one()
+        except SQLAlchemyError as e:
+            logger.error("Error creating record: %s", values.get("name"))
+            return DataValidationError(e)
+
+    @classmethod
+    def coalesce(cls, key, loader):
+        """Runs loader once for concurrent identical reads
+
+        Callers that joined another thread's call get copies of its
+        Customers merged into their own session without another query.
+        """
+        result, shared = reads.do(key, loader)
+        if not shared or result is None:
+            return result
+        if isinstance(result, list):
+            return [db.session.merge(customer, load=False) for customer in result]
+        return db.session.merge(result, load=False)
+
+    @classmethod
+    @traced("Customer.fetch")
+    def fetch(cls, statement):
+        """Returns the Customers a select() statement finds as a list
+
+        Concurrent calls are coalesced on the statement's cache key, which
+        SQLAlchemy computes far more cheaply than compiling it to SQL.
+        """
+        cache_key = statement._generate_cache_key()  # pylint: disable=protected-access
+        key = (cache_key.key, tuple(param.effective_value for param in cache_key.bindparams))
+        return cls.coalesce(key, lambda: db.session.scalars(statement).all())
+
+    @classmethod
+    @traced("Customer.all")
     def all(cls):
         """Returns all of the Customers in the database"""
         logger.info("Processing all Customers")
-        return cls.query.all()
+        return cls.coalesce("all", lambda: db.session.scalars(cls.find_all()).all())
 
     @classmethod
-    def find(cls, by_id):
-        """Finds a Customer by it's ID"""
+    @traced("Customer.find")
+    def find(cls, by_id, member_since: date = None):
+        """Finds a Customer by it's ID
+
+        Args:
+            by_id (int): the id of the Customer
+            member_since (date): the Customer's member_since, if known, so a
+                range partitioned table looks in one partition
+        """
         logger.info("Processing lookup for id %s ...", by_id)
-        return cls.query.session.get(cls, by_id)
+        if member_since is None:
+            return cls.coalesce(("find", by_id), lambda: db.session.get(cls, by_id))
+        statement = select(cls).where(cls.by_id(by_id, member_since))
+        return cls.coalesce(("find", by_id, member_since), lambda: db.session.scalars(statement).first())
+
+    @classmethod
+    def by_id(cls, by_id, member_since: date = None):
+        """
+        Returns the condition that selects a Customer by id
+
+        With CUSTOMER_PARTITION_BY=range an id alone has to be looked up in
+        every partition; member_since narrows it down to the one holding it.
+        """
+        table = cls.__table__
+        if member_since is None:
+            return table.c.id == by_id
+        return (table.c.id == by_id) & (table.c.member_since == member_since)
+
+    @classmethod
+    @traced("Customer.find_many")
+    def find_many(cls, ids: list) -> dict:
+        """Finds the Customers with the given ids
+
+        Customers already loaded in the session are used as they are; the
+        rest are read with a single WHERE id = ANY(...) query.
+
+        Returns:
+            dict: {id: Customer} for each of the ids that exists
+        """
+        logger.info("Processing lookup for %d ids ...", len(ids))
+        found = {}
+        wanted = []
+        for by_id in dict.fromkeys(ids):
+            customer = db.session.identity_map.get(identity_key(cls, by_id))
+            if customer is not None and not inspect(customer).expired:
+                found[by_id] = customer
+            else:
+                wanted.append(by_id)
+        if wanted:
+            statement = select(cls).where(cls.id == any_(bindparam("ids", wanted, type_=ARRAY(db.Integer))))
+            customers = cls.coalesce(("find_many", tuple(wanted)), lambda: db.session.scalars(statement).all())
+            found.update((customer.id, customer) for customer in customers)
+        return found
+
+    @classmethod
+    def find_all(cls):
+        """Returns a select() of all Customers, to narrow and pass to fetch()"""
+        return select(cls)
 
     @classmethod
     def find_by_name(cls, name):
-        """Returns all Customers with the given name
+        """Returns a select() of the Customers with the given name
 
         Args:
             name (string): the name of the Customers you want to match
         """
         logger.info("Processing name query for %s ...", name)
-        return cls.query.filter(cls.name == name)
+        return select(cls).where(cls.name == name)
 
     @classmethod
     def find_by_address(cls, address):
-        """Returns all Customers with the given address
+        """Returns a select() of the Customers with the given address
 
         Args:
             name (string): the address of the Customers you want to match
         """
         logger.info("Processing address query for %s ...", address)
-        return cls.query.filter(cls.address == address)
+        return select(cls).where(cls.address == address)
 
     @classmethod
     def find_by_email(cls, email):
-        """Returns all Customers with the given email
+        """Returns a select() of the Customers with the given email
 
         Args:
             name (string): the email of the Customers you want to match
         """
         logger.info("Processing address query for %s ...", email)
-        return cls.query.filter(cls.email == email)
+        return select(cls).where(cls.email == email)
 
     @classmethod
     def find_by_phone(cls, phone_number):
-        """Returns all Customers with the given phone number
+        """Returns a select() of the Customers with the given phone number
 
         Args:
             name (string): the phone number of the Customers you want to match
         """
         logger.info("Processing phone query for %s ...", phone_number)
-        return cls.query.filter(cls.phone_number == phone_number)
+        return select(cls).where(cls.phone_number == phone_number)
 
     @classmethod
     def find_by_member_since(cls, member_since):
-        """Returns all Customers with the given membership date
+        """Returns a select() of the Customers with the given membership date
 
         Args:
             name (string): the date of the Customers you want to match
         """
         logger.info("Processing address query for %s ...", member_since)
-        return cls.query.filter(cls.member_since == member_since)
+        return select(cls).where(cls.member_since == member_since)
+
+    @classmethod
+    def filter_membership(cls, query, status=None, member_since_from=None, member_since_to=None):
+        """Narrows a Customer query by status and a range of membership dates
+
+        Args:
+            query (Query or Select): the Customer query to narrow
+            status (string): the status the Customers must have
+            member_since_from (date): the earliest membership date, inclusive
+            member_since_to (date): the latest membership date, inclusive
+        """
+        logger.info(
+            "Processing membership query for %s from %s to %s ...",
+            status, member_since_from, member_since_to,
+        )
+        if status:
+            query = query.filter(cls.status == status)
+        if member_since_from:
+            query = query.filter(cls.member_since >= member_since_from)
+        if member_since_to:
+            query = query.filter(cls.member_since <= member_since_to)
+        return query
+
+
+######################################################################
+#  V A L I D A T I O N
+######################################################################
+# Lengths follow the column sizes so bad data is caught before the database
+CUSTOMER_SCHEMA = Schema(
+    Field("name", min_length=1, max_length=Customer.name.type.length),
+    Field("address", min_length=1, max_length=Customer.address.type.length),
+    Field("email", max_length=Customer.email.type.length, pattern=EMAIL),
+    Field("phone_number", max_length=Customer.phone_number.type.length, pattern=PHONE),
+    Field("member_since", is_date=True),
+)
+
+
+def validate_customer(data, partial: bool = False) -> dict:
+    """
+    Checks a Customer payload and returns its converted field values
+
+    Raises:
+        DataValidationError: listing every problem with the payload
+    """
+    values, errors = CUSTOMER_SCHEMA.validate(data, partial)
+    if errors:
+        raise DataValidationError("Invalid Customer: " + "; ".join(errors), errors)
+    return values
+
+
+######################################################################
+#  P A R T I T I O N S
+######################################################################
+def month_partitions(start: date, months: int) -> list:
+    """Returns (name, first day, first day of next month) for each month"""
+    partitions = []
+    year, month = start.year, start.month
+    for _ in range(months):
+        first = date(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        partitions.append((f"customer_{first:%Y_%m}", first, date(year, month, 1)))
+    return partitions
+
+
+def create_partitions(connection, start: date = None, months: int = 12) -> list:
+    """
+    Creates the partitions the customer table needs
+
+    Hash partitioning gets all of its partitions at once. Range partitioning
+    gets a default partition for member_since dates that have no partition
+    of their own, and a monthly partition for each of the months from start
+    and for each month that the default partition holds rows of. Those rows
+    are moved into their new partition.
+
+    Returns:
+        list: the names of the partitions that were created
+    """
+    if PARTITION_BY == "hash":
+        names = [f"customer_p{i}" for i in range(HASH_PARTITIONS)]
+        for i, name in enumerate(names):
+            logger.info("Creating partition %s", name)
+            connection.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF customer "
+                    f"FOR VALUES WITH (MODULUS {HASH_PARTITIONS}, REMAINDER {i})"
+                )
+            )
+        return names
+    if PARTITION_BY != "range":
+        return []
+
+    created = []
+    if not table_exists(connection, "customer_default"):
+        logger.info("Creating partition customer_default")
+        connection.execute(text("CREATE TABLE customer_default PARTITION OF customer DEFAULT"))
+        created.append("customer_default")
+    held = connection.execute(
+        text("SELECT DISTINCT date_trunc('month', member_since)::date FROM customer_default")
+    ).scalars()
+    partitions = set(month_partitions(start or date.today().replace(day=1), months))
+    for first in held:
+        partitions.update(month_partitions(first, 1))
+    for name, first, last in sorted(partitions):
+        if not table_exists(connection, name):
+            add_month_partition(connection, name, first, last)
+            created.append(name)
+    return created
+
+
+def add_month_partition(connection, name: str, first: date, last: date) -> None:
+    """
+    Adds a monthly partition to the customer table
+
+    A new partition may not overlap rows of the default partition, so it is
+    built as a plain table, filled with those rows and then attached.
+    """
+    logger.info("Creating partition %s", name)
+    connection.execute(text(f"CREATE TABLE {name} (LIKE customer INCLUDING CONSTRAINTS)"))
+    connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM customer_default WHERE member_since >= '{first}' "
+            f"AND member_since < '{last}' RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        )
+    )
+    connection.execute(text(f"ALTER TABLE customer ATTACH PARTITION {name} FOR VALUES FROM ('{first}') TO ('{last}')"))
+
+
+def table_exists(connection, name: str) -> bool:
+    """Tells whether a table is on the connection's search path"""
+    return connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+@event.listens_for(Customer.__table__, "after_create")
+def create_initial_partitions(_target, connection, **_kwargs):
+    """Gives a newly created partitioned customer table somewhere to put rows"""
+    today = date.today()
+    start = date.fromisoformat(PARTITION_START) if PARTITION_START else today
+    # from the first month through a year ahead
+    months = (today.year - start.year) * 12 + today.month - start.month + 12
+    create_partitions(connection, start.replace(day=1), months)
@@ -21,11 +21,18 @@ This service implements a REST API that allows you to Create, Read, Update
 and Delete Customers from the inventory of customers in the CustomerShop
 """
 
-from datetime import date
+import base64
+import hashlib
+import json
+from datetime import date, datetime
 from flask import jsonify, request, url_for, abort
 from flask import current_app as app  # Import Flask application
-from service.models import Customer
+from werkzeug.exceptions import ServiceUnavailable
+from service.models import Customer, DataValidationError, IdempotencyKey, IdempotencyKeyTaken, Job
 from service.common import status  # HTTP Status Codes
+from service.common.assets import send_page
+from service.common.jobs import JobQueueFull
+from service.common.readiness import check_readiness
 
 
 ######################################################################
@@ -37,6 +44,19 @@ def health_check():
     return jsonify(status=200, message="Healthy"), status.HTTP_200_OK
 
 
+######################################################################
+# GET READINESS CHECK
+######################################################################
+@app.route("/ready")
+def readiness_check():
+    """Let Kubernetes know whether to send this pod traffic"""
+    ready, report = check_readiness()
+    code = status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    response = jsonify(status=code, message="Ready" if ready else "Not Ready", **report)
+    response.cache_control.no_store = True
+    return response, code
+
+
 ######################################################################
 # GET INDEX
 ######################################################################
@@ -44,7 +64,7 @@ def health_check():
 def index():
     """Root URL response"""
     app.logger.info("Request for Root URL")
-    return app.send_static_file("index.html")
+    return send_page("index.html")
 
 
 @app.route("/", methods=["GET"])
@@ -84,26 +104,55 @@ def create_customers():
     """
     Create a Customer
     This endpoint will create a Customer based the data in the body that is posted
+
+    If an Idempotency-Key header is sent, retries with the same key get the
+    original response back instead of creating another Customer
     """
     app.logger.info("Request to Create a Customer...")
     check_content_type("application/json")
 
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return _create_customer()
+    if len(key) > 255:
+        abort(status.HTTP_400_BAD_REQUEST, "Idempotency-Key must be at most 255 characters")
+
+    fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+    record = IdempotencyKey.find(key)
+    if record is None:
+        try:
+            return _create_customer((key, fingerprint))
+        except IdempotencyKeyTaken:
+            # a concurrent request with the same key got there first
+            record = IdempotencyKey.find(key)
+    if record.fingerprint != fingerprint:
+        abort(status.HTTP_409_CONFLICT, f"Idempotency-Key {key} was used with a different request")
+
+    app.logger.info("Replaying response for Idempotency-Key [%s]", key)
+    return _created(record.customer_id, record.response, {"Idempotent-Replayed": "true"})
+
+
+def _create_customer(idempotency: tuple = None):
+    """Creates a Customer from the request body"""
     customer = Customer()
     # Get the data from the request and deserialize it
     data = request.get_json()
-    app.logger.info("Processing: %s", data)
+    app.logger.debug("Processing: %s", data)
     customer.deserialize(data)
 
     # Save the new Customer to the database
-    customer.create()
+    customer.create(idempotency)
     app.logger.info("Customer with new id [%s] saved!", customer.id)
+    return _created(customer.id, customer.serialize())
+
 
-    # Return the location of the new Customer
-    location_url = url_for("get_customer", customer_id=customer.id, _external=True)
+def _created(customer_id: int, body: dict, headers: dict = None):
+    """Returns 201 Created with the location of the new Customer"""
+    location_url = url_for("get_customer", customer_id=customer_id, _external=True)
     return (
-        jsonify(customer.serialize()),
+        jsonify(body),
         status.HTTP_201_CREATED,
-        {"Location": location_url},
+        {"Location": location_url, **(headers or {})},
     )
 
 
@@ -117,7 +166,7 @@ def get_customer(customer_id):
     This endpoint will read a customer based on its id
     """
     app.logger.info("Request to Retrieve a Customer with id [%s]...", customer_id)
-    customer = Customer.find(customer_id)
+    customer = Customer.find(customer_id, parse_date("member_since"))
     if not customer:
         abort(status.HTTP_404_NOT_FOUND, f"Customer with id [{customer_id}] not found")
 
@@ -138,22 +187,48 @@ def update_customers(customer_id):
     app.logger.info("Request to Update a customer with id [%s]", customer_id)
     check_content_type("application/json")
 
-    # Attempt to find the Customer and abort if not found
-    customer = Customer.find(customer_id)
+    # Validate the new data before touching the database
+    data = request.get_json()
+    app.logger.debug("Processing: %s", data)
+    customer = Customer().deserialize(data)
+    values = {field: getattr(customer, field) for field in Customer.FIELDS}
+    return _update_customer(customer_id, values, data.get("version"))
+
+
+############################################################
+# PARTIALLY UPDATE AN EXISTING CUSTOMER
+############################################################
+@app.route("/customers/<int:customer_id>", methods=["PATCH"])
+def patch_customers(customer_id):
+    """
+    Partially update a Customer
+
+    Only the fields in the body are validated and written; the rest of
+    the Customer is left as it is
+    """
+    app.logger.info("Request to Patch a customer with id [%s]", customer_id)
+    check_content_type("application/json")
+
+    data = request.get_json()
+    app.logger.debug("Processing: %s", data)
+    values = Customer.deserialize_fields(data)
+    if not values:
+        abort(status.HTTP_400_BAD_REQUEST, f"Nothing to update, send any of {', '.join(Customer.FIELDS)}")
+    return _update_customer(customer_id, values, data.get("version"))
+
+
+def _update_customer(customer_id, values: dict, version):
+    """Writes the validated values to a Customer, aborting if it is not found"""
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        abort(status.HTTP_400_BAD_REQUEST, "version must be an integer")
+
+    customer = Customer.update_by_id(customer_id, values, version, member_since=parse_date("member_since"))
     if not customer:
         abort(
             status.HTTP_404_NOT_FOUND,
             f"Customer with id '{customer_id}' was not found.",
         )
 
-    # Update the Customer with the new data
-    data = request.get_json()
-    app.logger.info("Processing: %s", data)
-    customer.deserialize(data)
-
-    # Save the updates to the database
-    customer.update()
-
     app.logger.info("Customer with ID: %d updated.", customer.id)
     return jsonify(customer.serialize()), status.HTTP_200_OK
 
@@ -166,7 +241,7 @@ def list_customers():
     """List customers"""
     app.logger.info("Request for customer list")
 
-    customers = []
+    query = Customer.find_all()
 
     # Parse any arguments from the query string
     name = request.args.get("name")
@@ -177,28 +252,196 @@ def list_customers():
 
     if name:
         app.logger.info("Find by name: %s", name)
-        customers = Customer.find_by_name(name)
+        query = Customer.find_by_name(name)
     elif address:
         app.logger.info("Find by address: %s", address)
-        customers = Customer.find_by_address(address)
+        query = Customer.find_by_address(address)
     elif email:
         app.logger.info("Find by email: %s", address)
-        customers = Customer.find_by_email(email)
+        query = Customer.find_by_email(email)
     elif phone_number:
         app.logger.info("Find by phone number: %s", phone_number)
-        customers = Customer.find_by_phone(phone_number)
+        query = Customer.find_by_phone(phone_number)
     elif member_since:
         app.logger.info("Find by member_since: %s", member_since)
         # Convert the member_since parameter to a date using fromisoformat
         member_since_date = date.fromisoformat(member_since)
-        customers = Customer.find_by_member_since(member_since_date)
+        query = Customer.find_by_member_since(member_since_date)
     else:
         app.logger.info("Find all")
-        customers = Customer.all()
 
+    # These narrow any of the queries above
+    query = Customer.filter_membership(
+        query,
+        status=request.args.get("status"),
+        member_since_from=parse_date("member_since_from"),
+        member_since_to=parse_date("member_since_to"),
+    )
+
+    customers, next_url = fetch_page(query)
     results = [customer.serialize() for customer in customers]
     app.logger.info("Returning %d customers", len(results))
-    return jsonify(results), status.HTTP_200_OK
+    headers = {"Link": f'<{next_url}>; rel="next"'} if next_url else {}
+    return jsonify(results), status.HTTP_200_OK, headers
+
+
+############################################################
+# LIST CUSTOMER CHANGES
+############################################################
+@app.route("/customers/changes", methods=["GET"])
+def list_customer_changes():
+    """
+    List the changes to customers since a cursor
+
+    Returns a page of upserted customers and deleted ids in the order they
+    changed, plus the cursor to pass as ?since= to get the next page
+    """
+    app.logger.info("Request for customer changes")
+    since = request.args.get("since")
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    position = decode_cursor(since) if since else None
+
+    changes = Customer.changes_since(position, limit + 1, app.config["CHANGE_FEED_LAG"])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    results = [
+        {"op": "upsert", "customer": customer.serialize()} if customer else {"op": "delete", "id": by_id}
+        for _, by_id, customer in changes
+    ]
+    cursor = encode_cursor(changes[-1][:2]) if changes else since
+    app.logger.info("Returning %d changes", len(results))
+    return jsonify(changes=results, next=cursor, has_more=has_more), status.HTTP_200_OK
+
+
+############################################################
+# READ A BATCH OF CUSTOMERS
+############################################################
+@app.route("/customers:batchGet", methods=["POST"])
+def batch_get_customers():
+    """
+    Read many customers at once
+
+    Takes {"ids": [...]} and returns the customers in the order of the ids,
+    along with the ids that were not found
+    """
+    app.logger.info("Request to Retrieve a batch of Customers")
+    check_content_type("application/json")
+    ids = request_object().get("ids")
+    if (
+        not isinstance(ids, list)
+        or not 0 < len(ids) <= 1000
+        or not all(isinstance(by_id, int) and not isinstance(by_id, bool) for by_id in ids)
+    ):
+        raise DataValidationError("ids must be a list of 1 to 1000 integer ids")
+
+    found = Customer.find_many(ids)
+    customers = [found[by_id].serialize() for by_id in ids if by_id in found]
+    missing = [by_id for by_id in dict.fromkeys(ids) if by_id not in found]
+    app.logger.info("Returning %d customers, %d missing", len(customers), len(missing))
+    return jsonify(customers=customers, missing=missing), status.HTTP_200_OK
+
+
+############################################################
+# BULK OPERATIONS
+############################################################
+@app.route("/customers:import", methods=["POST"])
+def start_import():
+    """
+    Starts a job that creates many customers
+
+    Takes {"customers": [...]} and returns the job to poll at /jobs/<id>
+    """
+    app.logger.info("Request to Import Customers")
+    check_content_type("application/json")
+    rows = request_object().get("customers")
+    if not isinstance(rows, list) or not 0 < len(rows) <= app.config["JOB_MAX_ROWS"]:
+        raise DataValidationError(f"customers must be a list of 1 to {app.config['JOB_MAX_ROWS']} customers")
+    return queue_job("import", {"customers": rows})
+
+
+@app.route("/customers:suspend", methods=["POST"])
+def start_suspend():
+    """
+    Starts a job that suspends every active customer matching the filters
+
+    Takes {"member_since_from": "YYYY-MM-DD", "member_since_to": "YYYY-MM-DD"}
+    """
+    app.logger.info("Request to Suspend Customers")
+    check_content_type("application/json")
+    return queue_job("suspend", job_filters(request_object()))
+
+
+@app.route("/customers:export", methods=["POST"])
+def start_export():
+    """
+    Starts a job that collects every customer matching the filters
+
+    Takes the same filters as suspend plus an optional "status"
+    """
+    app.logger.info("Request to Export Customers")
+    check_content_type("application/json")
+    return queue_job("export", job_filters(request_object()))
+
+
+@app.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    """Returns the progress, and once finished the result, of a job"""
+    app.logger.info("Request for job [%s]", job_id)
+    job = Job.find(job_id)
+    if not job:
+        abort(status.HTTP_404_NOT_FOUND, f"Job with id [{job_id}] not found")
+    return jsonify(job.serialize()), status.HTTP_200_OK
+
+
+def queue_job(kind: str, params: dict):
+    """Records a job and hands it to the job runner"""
+    runner = app.extensions["jobs"]
+    job = Job.create(kind, params, runner.worker)
+    try:
+        runner.submit(job.id)
+    except JobQueueFull as error:
+        job.finish(error=str(error))
+        raise ServiceUnavailable("Too many jobs are running, try again later", retry_after=30) from error
+    location_url = url_for("get_job", job_id=job.id, _external=True)
+    return jsonify(job.serialize()), status.HTTP_202_ACCEPTED, {"Location": location_url}
+
+
+def job_filters(data: dict) -> dict:
+    """Checks the filters that select the customers for a bulk job"""
+    filters = {}
+    for name in ("status", "member_since_from", "member_since_to"):
+        value = data.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise DataValidationError(f"{name} must be a string")
+        if name != "status":
+            try:
+                date.fromisoformat(value)
+            except ValueError as error:
+                raise DataValidationError(f"Invalid {name}: {value}") from error
+        filters[name] = value
+    return filters
+
+
+############################################################
+# CUSTOMER STATISTICS
+############################################################
+@app.route("/customers/stats", methods=["GET"])
+def get_customer_stats():
+    """
+    Returns the number of customers per status and sign-ups per period
+
+    ?bucket= picks the period sign-ups are counted by: day, week or month
+    """
+    app.logger.info("Request for customer stats")
+    bucket = request.args.get("bucket", "month")
+    cache = app.extensions["stats_cache"]
+    results = cache.get_or_load(bucket, lambda: Customer.stats(bucket))
+    response = jsonify(results)
+    if cache.ttl > 0:
+        response.cache_control.max_age = int(cache.ttl)
+    return response, status.HTTP_200_OK
 
 
 ############################################################
@@ -209,10 +452,8 @@ def delete_customers(customer_id):
     """Delete customer"""
     app.logger.info("Request to Delete a customer with id [%s]..", customer_id)
 
-    customer = Customer.find(customer_id)
-    if customer:
-        app.logger.info("Customer with ID: %d found.", customer.id)
-        customer.delete()
+    if Customer.delete_by_id(customer_id, parse_date("member_since")):
+        app.logger.info("Customer with ID: %d found.", customer_id)
 
     app.logger.info("Customer with ID: %d delete complete.", customer_id)
     return {}, status.HTTP_204_NO_CONTENT
@@ -226,17 +467,16 @@ def suspend_customer(customer_id):
     """Suspend a customer's account"""
     app.logger.info("Request to suspend a customer with id [%s]..", customer_id)
 
-    customer = Customer.find(customer_id)
-    if customer:
-        app.logger.info("Customer with ID: %d found.", customer.id)
-        customer.status = "suspended"
-        customer.update()
-    else:
+    customer = Customer.update_by_id(
+        customer_id, {"status": "suspended"}, event_type="customer.suspended", member_since=parse_date("member_since")
+    )
+    if not customer:
         abort(
             status.HTTP_404_NOT_FOUND,
             f"Customer with id '{customer_id}' was not found.",
         )
 
+    app.logger.info("Customer with ID: %d suspended.", customer.id)
     return jsonify(customer.serialize()), status.HTTP_200_OK
 
 
@@ -244,7 +484,7 @@ def suspend_customer(customer_id):
 # Checks the ContentType of a request
 ######################################################################
 def check_content_type(content_type) -> None:
-    """Checks that the media type is correct"""
+    """Checks that the media type is correct, ignoring case and parameters such as charset"""
     if "Content-Type" not in request.headers:
         app.logger.error("No Content-Type specified.")
         abort(
@@ -252,7 +492,7 @@ def check_content_type(content_type) -> None:
             f"Content-Type must be {content_type}",
         )
 
-    if request.headers["Content-Type"] == content_type:
+    if request.mimetype == content_type:
         return
 
     app.logger.error("Invalid Content-Type: %s", request.headers["Content-Type"])
@@ -260,3 +500,79 @@ def check_content_type(content_type) -> None:
         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
         f"Content-Type must be {content_type}",
     )
+
+
+def request_object() -> dict:
+    """Returns the body of the request, which must be a JSON object"""
+    data = request.get_json()
+    if not isinstance(data, dict):
+        raise DataValidationError("body of request must be a JSON object")
+    return data
+
+
+######################################################################
+# Change feed cursors
+######################################################################
+def encode_cursor(position: tuple) -> str:
+    """Turns a position, such as a (timestamp, id) in the change feed, into an opaque cursor"""
+    values = [value.isoformat() if hasattr(value, "isoformat") else value for value in position]
+    data = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str, types: tuple = (datetime, int)) -> tuple:
+    """Turns an opaque cursor back into a position made of values of the given types"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            kind.fromisoformat(value) if hasattr(kind, "fromisoformat") else kind(value)
+            for kind, value in zip(types, values)
+        )
+    except (ValueError, TypeError) as error:
+        raise DataValidationError(f"Invalid cursor: {cursor}") from error
+
+
+def fetch_page(query) -> tuple:
+    """
+    Fetches the Customers for a listing, honoring ?sort=, ?limit= and ?after=
+
+    Sorted pages use keyset pagination: ?after= is the cursor of the last
+    Customer on the previous page, so each page starts with an index seek.
+
+    Returns:
+        tuple: (customers, the URL of the next page or None)
+    """
+    sort = request.args.get("sort")
+    limit = request.args.get("limit", type=int)
+    if not sort and limit is None:
+        return Customer.fetch(query), None
+
+    sort = sort or "id"
+    columns, _ = Customer.sort_columns(sort)
+    after = request.args.get("after")
+    position = decode_cursor(after, tuple(column.type.python_type for column in columns)) if after else None
+    query = Customer.sort_by(query, sort, position)
+    if limit is None:
+        return Customer.fetch(query), None
+
+    limit = min(max(limit, 1), 1000)
+    customers = Customer.fetch(query.limit(limit + 1))
+    if len(customers) <= limit:
+        return customers, None
+    customers = customers[:limit]
+    cursor = encode_cursor([getattr(customers[-1], column.key) for column in columns])
+    args = {**request.args.to_dict(), "after": cursor}
+    return customers, url_for("list_customers", _external=True, **args)
+
+
+def parse_date(name: str):
+    """Returns the ISO date in query parameter name, or None if it is not set"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError as error:
+        raise DataValidationError(f"Invalid {name}: {value}") from error
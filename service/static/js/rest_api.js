@@ -205,102 +205,173 @@ $(function () {
     // ****************************************
 
     $("#clear-btn").click(function () {
+        clearTimeout(search_timer);
         $("#customer_id").val("");
         $("#flash_message").empty();
         clear_form_data()
     });
 
     // ****************************************
-    // Search for a Customer
+    //  S E A R C H   R E S U L T S
     // ****************************************
 
-    $("#search-btn").click(function () {
+    const PAGE_SIZE = 50;     // customers requested per page
+    const RENDER_CHUNK = 20;  // rows added to the table per animation frame
+    const DEBOUNCE_MS = 300;  // how long typing must pause before searching
+
+    const SEARCH_FIELDS = {
+        "name": "#customer_name",
+        "address": "#customer_address",
+        "email": "#customer_email",
+        "phone_number": "#customer_phone",
+        "member_since": "#customer_since"
+    };
+    const COLUMNS = ["id", "name", "address", "email", "phone_number", "member_since", "status"];
+
+    let search_request = null;  // the request in flight, aborted when a newer search starts
+    let search_timer = null;    // the pending debounced search
+    let render_pass = 0;        // stops rendering rows of a superseded page
+    let page_cursors = [null];  // the ?after= cursor of every page up to the next one
+    let current_page = 0;
+    let search_params = {};     // the filters of the search being paged through
+
+    // Takes the filters of a new search from the form. Paging keeps using
+    // them, because the form may since have been filled in with a result.
+    function read_search_form() {
+        search_params = {};
+        for (const [param, field] of Object.entries(SEARCH_FIELDS)) {
+            let value = $(field).val();
+            if (value) {
+                search_params[param] = value;
+            }
+        }
+    }
 
-        let name = $("#customer_name").val();
-        let address = $("#customer_address").val();
-        let email = $("#customer_email").val();
-        let phone_number = $("#customer_phone").val();
-        let member_since = $("#customer_since").val();
+    // Builds the query string for a page of the current search
+    function search_query(page) {
+        let params = Object.assign({}, search_params);
+        params.limit = PAGE_SIZE;
+        if (page_cursors[page]) {
+            params.after = page_cursors[page];
+        }
+        return $.param(params);
+    }
 
-        let queryString = ""
+    // Returns the cursor of the next page from the Link header, if there is one
+    function next_page_cursor(ajax) {
+        let link = ajax.getResponseHeader("Link") || "";
+        let match = link.match(/<([^>]*)>;\s*rel="next"/);
+        return match ? new URL(match[1], window.location.href).searchParams.get("after") : null;
+    }
 
-        if (name) {
-            queryString += 'name=' + name
-        }
-        if (address) {
-            if (queryString.length > 0) {
-                queryString += '&address=' + address
-            } else {
-                queryString += 'address=' + address
-            }
-        }
-        if (email) {
-            if (queryString.length > 0) {
-                queryString += '&email=' + email
-            } else {
-                queryString += 'email=' + email
+    // Replaces the rows of the results table a few at a time so the page stays responsive
+    function render_results(customers) {
+        let pass = ++render_pass;
+        let body = $("#search_results_body");
+        let index = 0;
+        body.empty();
+
+        function render_chunk() {
+            if (pass != render_pass) {
+                return;
             }
-        }
-        if (phone_number) {
-            if (queryString.length > 0) {
-                queryString += '&phone_number=' + phone_number
-            } else {
-                queryString += 'phone_number=' + phone_number
+            let rows = [];
+            for (let end = Math.min(index + RENDER_CHUNK, customers.length); index < end; index++) {
+                let row = $("<tr></tr>").attr("id", `row_${index}`);
+                for (const column of COLUMNS) {
+                    row.append($("<td></td>").text(customers[index][column]));
+                }
+                rows.push(row);
             }
-        }
-        if (member_since) {
-            if (queryString.length > 0) {
-                queryString += '&member_since=' + member_since
-            } else {
-                queryString += 'member_since=' + member_since
+            body.append(rows);
+            if (index < customers.length) {
+                window.requestAnimationFrame(render_chunk);
             }
         }
+        render_chunk();
+    }
 
-        $("#flash_message").empty();
+    function update_pager() {
+        $("#page_number").text(`Page ${current_page + 1}`);
+        $("#previous-btn").prop("disabled", current_page == 0);
+        $("#next-btn").prop("disabled", page_cursors.length <= current_page + 1);
+    }
 
-        let ajax = $.ajax({
+    // Fetches and shows one page of results. Searches started by a button
+    // report their outcome, and the Search button copies the first result
+    // into the form.
+    function search(page, pressed, copy_result) {
+        clearTimeout(search_timer);
+        if (search_request) {
+            search_request.abort();
+        }
+        if (pressed) {
+            $("#flash_message").empty();
+        }
+
+        let ajax = search_request = $.ajax({
             type: "GET",
-            url: `/customers?${queryString}`,
+            url: `/customers?${search_query(page)}`,
             contentType: "application/json",
             data: ''
         })
 
         ajax.done(function(res){
-            //alert(res.toSource())
-            $("#search_results").empty();
-            let table = '<table class="table table-striped" cellpadding="10">'
-            table += '<thead><tr>'
-            table += '<th class="col-md-2">ID</th>'
-            table += '<th class="col-md-2">Name</th>'
-            table += '<th class="col-md-2">Address</th>'
-            table += '<th class="col-md-2">Email</th>'
-            table += '<th class="col-md-2">Phone No</th>'
-            table += '<th class="col-md-2">Member Since</th>'
-            table += '<th class="col-md-2">Status</th>'
-            table += '</tr></thead><tbody>'
-            let firstCustomer = "";
-            for(let i = 0; i < res.length; i++) {
-                let customer = res[i];
-                table +=  `<tr id="row_${i}"><td>${customer.id}</td><td>${customer.name}</td><td>${customer.address}</td><td>${customer.email}</td><td>${customer.phone_number}</td><td>${customer.member_since}</td><td>${customer.status}</td></tr>`;
-                if (i == 0) {
-                    firstCustomer = customer;
-                }
+            current_page = page;
+            page_cursors.length = page + 1;
+            let cursor = next_page_cursor(ajax);
+            if (cursor) {
+                page_cursors.push(cursor);
             }
-            table += '</tbody></table>';
-            $("#search_results").append(table);
+            render_results(res);
+            update_pager();
 
-            // copy the first result to the form
-            if (firstCustomer != "") {
-                update_form_data(firstCustomer)
+            if (pressed) {
+                // copy the first result to the form
+                if (copy_result && res.length > 0) {
+                    update_form_data(res[0])
+                }
+                flash_message("Success")
             }
-
-            flash_message("Success")
         });
 
         ajax.fail(function(res){
-            flash_message(res.responseJSON.message)
+            if (res.statusText != "abort") {
+                flash_message(res.responseJSON ? res.responseJSON.message : "Server error!")
+            }
+        });
+
+        ajax.always(function(){
+            if (search_request === ajax) {
+                search_request = null;
+            }
         });
+    }
+
+    // ****************************************
+    // Search for a Customer
+    // ****************************************
+
+    $("#search-btn").click(function () {
+        read_search_form();
+        search(0, true, true);
+    });
+
+    $("#next-btn").click(function () {
+        search(current_page + 1, true);
+    });
+
+    $("#previous-btn").click(function () {
+        search(current_page - 1, true);
+    });
 
+    // Search as the user types, once they pause
+    $(Object.values(SEARCH_FIELDS).join(", ")).on("input", function () {
+        clearTimeout(search_timer);
+        search_timer = setTimeout(function () {
+            read_search_form();
+            search(0, false);
+        }, DEBOUNCE_MS);
     });
 
 })
@@ -0,0 +1,95 @@
+"""
+Test fixtures shared by the whole suite
+
+Each test runs inside a transaction that is rolled back when it ends, so
+tests start with empty tables without deleting and committing anything.
+The application's own commits and rollbacks become savepoints inside that
+transaction. Tests that need real commits, because other threads or
+connections must see their data or because they depend on now() moving,
+are marked with @pytest.mark.commits and have the tables emptied after
+them instead.
+
+When the suite runs in parallel with pytest-xdist (pytest -n auto) each
+worker gets its own schema, so workers never see each other's rows.
+"""
+import os
+from contextlib import nullcontext
+from unittest.mock import patch
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from service import config
+
+# These must happen before the app, and so its engine, is created
+
+# The job heartbeat would run on the connection of whichever test is
+# running, so tests call JobRunner.beat themselves
+config.JOB_HEARTBEAT = 0
+
+WORKER = os.getenv("PYTEST_XDIST_WORKER")
+
+if WORKER:
+    url = make_url(os.getenv("DATABASE_URI", config.DATABASE_URI))
+    schema = f"test_{WORKER}"
+    engine = create_engine(url)
+    with engine.begin() as setup:
+        setup.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+    engine.dispose()
+    url = url.update_query_dict({"options": f"-csearch_path={schema}"})
+    os.environ["DATABASE_URI"] = config.DATABASE_URI = config.SQLALCHEMY_DATABASE_URI = url.render_as_string(False)
+
+# pylint: disable=wrong-import-position,wrong-import-order,ungrouped-imports
+from flask import has_app_context  # noqa: E402
+from wsgi import app  # noqa: E402
+from service.models import db  # noqa: E402
+
+
+def pytest_configure(config):  # pylint: disable=redefined-outer-name
+    """Registers the markers used by the suite"""
+    config.addinivalue_line("markers", "commits: the test commits for real instead of being rolled back")
+
+
+def app_context():
+    """Returns the app context to work in, reusing the test's if it pushed one"""
+    return nullcontext() if has_app_context() else app.app_context()
+
+
+def empty_tables() -> None:
+    """Deletes every row that committed tests left behind"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for table in reversed(db.metadata.sorted_tables):
+                connection.execute(table.delete())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def clean_database():
+    """Starts the run with empty tables"""
+    empty_tables()
+    # Sessions join the test's transaction with a savepoint they can commit
+    db.session.session_factory.configure(join_transaction_mode="create_savepoint")
+    yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_transaction(request):
+    """Runs the test in a transaction that is rolled back afterwards"""
+    if request.node.get_closest_marker("commits"):
+        yield
+        with app_context():
+            db.session.remove()
+        empty_tables()
+        return
+
+    with app_context():
+        engines = db.engines
+        connection = engines[None].connect()
+        transaction = connection.begin()
+        db.session.remove()
+        try:
+            with patch.dict(engines, {None: connection}):
+                yield
+                db.session.remove()
+        finally:
+            transaction.rollback()
+            connection.close()
@@ -0,0 +1,87 @@
+"""
+Test cases for Admission Control
+"""
+import logging
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+from wsgi import app
+from service.common import status
+from service.common.admission import AdmissionController
+
+
+class TestAdmissionController(TestCase):
+    """Admission Controller Tests"""
+
+    def test_limit(self):
+        """It should turn requests away once the limit is reached"""
+        controller = AdmissionController(2, max_wait=0)
+        self.assertTrue(controller.acquire())
+        self.assertTrue(controller.acquire())
+        self.assertFalse(controller.acquire())
+        self.assertEqual(controller.rejected, 1)
+        controller.release(0.01)
+        self.assertTrue(controller.acquire())
+        self.assertEqual(controller.in_flight, 2)
+
+    def test_wait_for_slot(self):
+        """It should admit a request when a slot frees up while it waits"""
+        controller = AdmissionController(1, max_wait=5)
+        controller.acquire()
+        timer = threading.Timer(0.05, controller.release, (0.01,))
+        timer.start()
+        self.assertTrue(controller.acquire())
+        timer.join()
+
+    def test_adapt_to_latency(self):
+        """It should shrink the limit while requests are slow and grow it back"""
+        controller = AdmissionController(10, max_wait=0, target_latency=0.5, min_concurrency=2)
+        for _ in range(30):
+            controller.acquire()
+            controller.release(1.0)
+        self.assertEqual(controller.limit, 2)
+        for _ in range(100):
+            controller.acquire()
+            controller.release(0.1)
+        self.assertEqual(controller.limit, 10)
+
+    def test_fixed_limit(self):
+        """It should keep the limit without a target latency"""
+        controller = AdmissionController(3, max_wait=0)
+        controller.acquire()
+        controller.release(60)
+        self.assertEqual(controller.limit, 3)
+
+
+class TestAdmissionRoutes(TestCase):
+    """Admission Control of the Service Routes"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["TESTING"] = True
+        app.logger.setLevel(logging.CRITICAL)
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.controller = app.extensions["admission"]
+
+    def test_release_slot(self):
+        """It should free the slot of each request it admits"""
+        response = self.client.get("/customers")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.controller.in_flight, 0)
+
+    def test_shed_load(self):
+        """It should answer 503 with Retry-After when the worker is full"""
+        with patch.multiple(self.controller, in_flight=self.controller.max_concurrency, max_wait=0):
+            response = self.client.get("/customers")
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response.headers["Retry-After"], str(app.config["ADMISSION_RETRY_AFTER"]))
+            self.assertIn("overloaded", response.get_json()["message"])
+            self.assertEqual(self.controller.in_flight, self.controller.max_concurrency)
+
+    def test_exempt_endpoints(self):
+        """It should keep answering health checks when the worker is full"""
+        with patch.multiple(self.controller, in_flight=self.controller.max_concurrency, max_wait=0):
+            self.assertEqual(self.client.get("/health").status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get("/nowhere").status_code, status.HTTP_404_NOT_FOUND)
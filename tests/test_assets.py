@@ -0,0 +1,128 @@
+"""
+Test cases for the Static Assets
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+from wsgi import app
+from service.common import status
+from service.common.assets import AssetManifest, hashed_name, precompress
+
+
+class TestAssets(TestCase):
+    """Static Asset Tests"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.folder, "js"))
+        self.write("js/app.js", "console.log('hello');" * 100)
+        self.write("logo.png", "not really a png")
+        self.write("index.html", '<script src="static/js/app.js"></script><img src = "static/logo.png">')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, filename: str, text: str) -> None:
+        """Writes a file into the temporary static folder"""
+        with open(os.path.join(self.folder, filename), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def serve_from_folder(self):
+        """Serves the temporary static folder instead of the real one"""
+        return patch.dict(app.extensions, {"assets": AssetManifest(self.folder)})
+
+    def test_hashed_names(self):
+        """It should name each file after a hash of its content"""
+        manifest = AssetManifest(self.folder)
+        name = manifest.hashed["js/app.js"]
+        self.assertRegex(name, r"^js/app\.[0-9a-f]{12}\.js$")
+        self.assertEqual(manifest.sources[name], "js/app.js")
+        self.assertEqual(hashed_name("a/b.min.css", "abc"), "a/b.min.abc.css")
+        self.write("js/app.js", "changed")
+        self.assertNotEqual(AssetManifest(self.folder).hashed["js/app.js"], name)
+        self.assertEqual(manifest.url("missing.js"), "static/missing.js")
+
+    def test_rewrite_page(self):
+        """It should point the page at the hashed URLs"""
+        manifest = AssetManifest(self.folder)
+        page = manifest.page("index.html")
+        self.assertIn(f'src="static/{manifest.hashed["js/app.js"]}"', page)
+        self.assertIn(f'src = "static/{manifest.hashed["logo.png"]}"', page)
+        self.assertIs(manifest.page("index.html"), page)
+
+    def test_precompress(self):
+        """It should write an up to date .gz next to each compressible file"""
+        written = precompress(self.folder)
+        target = os.path.join(self.folder, "js/app.js.gz")
+        self.assertIn(target, written)
+        self.assertNotIn(os.path.join(self.folder, "logo.png.gz"), written)
+        with open(target, "rb") as file:
+            self.assertEqual(gzip.decompress(file.read()), b"console.log('hello');" * 100)
+        self.assertEqual(precompress(self.folder), [])
+        self.assertEqual(AssetManifest(self.folder).variants["js/app.js"], {"gzip": "js/app.js.gz"})
+
+    def test_stale_variant(self):
+        """It should not use a compressed variant older than its file"""
+        precompress(self.folder)
+        path = os.path.join(self.folder, "js/app.js")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        self.assertEqual(AssetManifest(self.folder).variants["js/app.js"], {})
+
+    def test_serve_hashed_asset(self):
+        """It should let browsers cache a hashed asset for good"""
+        with self.serve_from_folder():
+            name = app.extensions["assets"].hashed["js/app.js"]
+            response = self.client.get(f"/static/{name}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.mimetype, "text/javascript")
+            self.assertTrue(response.cache_control.immutable)
+            self.assertTrue(response.cache_control.public)
+            self.assertEqual(response.cache_control.max_age, app.config["ASSET_MAX_AGE"])
+            response.close()
+
+    def test_serve_plain_asset(self):
+        """It should make browsers revalidate an asset requested by its plain name"""
+        with self.serve_from_folder():
+            response = self.client.get("/static/js/app.js")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(response.cache_control.immutable)
+            self.assertIsNone(response.cache_control.max_age)
+            etag = response.headers["ETag"]
+            response.close()
+            response = self.client.get("/static/js/app.js", headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_serve_precompressed(self):
+        """It should send the precompressed variant to clients that accept it"""
+        precompress(self.folder)
+        with self.serve_from_folder():
+            name = app.extensions["assets"].hashed["js/app.js"]
+            response = self.client.get(f"/static/{name}", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.mimetype, "text/javascript")
+            self.assertIn("Accept-Encoding", response.vary)
+            self.assertEqual(gzip.decompress(response.data), b"console.log('hello');" * 100)
+            response = self.client.get(f"/static/{name}", headers={"Accept-Encoding": "identity"})
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual(response.data, b"console.log('hello');" * 100)
+            response.close()
+
+    def test_serve_missing_asset(self):
+        """It should return 404 for a file that does not exist"""
+        with self.serve_from_folder():
+            response = self.client.get("/static/js/missing.js")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_index_page(self):
+        """It should send the home page with hashed URLs and an ETag"""
+        response = self.client.get("/", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.cache_control.no_cache)
+        self.assertRegex(response.get_data(as_text=True), r'src="static/js/rest_api\.[0-9a-f]{12}\.js"')
+        response = self.client.get("/", headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -2,12 +2,15 @@
 CLI Command Extensions for Flask
 """
 import os
+from datetime import date
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 from click.testing import CliRunner
 # pylint: disable=unused-import
 from wsgi import app  # noqa: F401
-from service.common.cli_commands import db_create  # noqa: E402
+from service.common.cli_commands import (  # noqa: E402
+    db_create, prune_tombstones, prune_idempotency_keys, outbox_dispatch, create_partitions_command
+)
 
 
 class TestFlaskCLI(TestCase):
@@ -23,3 +26,54 @@ class TestFlaskCLI(TestCase):
         with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
             result = self.runner.invoke(db_create)
             self.assertEqual(result.exit_code, 0)
+
+    @patch('service.common.cli_commands.db')
+    def test_prune_tombstones(self, db_mock):
+        """It should call the prune-tombstones command"""
+        db_mock.session.query.return_value.filter.return_value.delete.return_value = 3
+        with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+            result = self.runner.invoke(prune_tombstones, ["--days", "7"])
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("Removed 3 tombstones", result.output)
+            db_mock.session.commit.assert_called_once()
+
+    @patch('service.common.cli_commands.db')
+    def test_prune_idempotency_keys(self, db_mock):
+        """It should call the prune-idempotency-keys command"""
+        db_mock.session.query.return_value.filter.return_value.delete.return_value = 2
+        with app.app_context():
+            result = self.runner.invoke(prune_idempotency_keys)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Removed 2 idempotency keys", result.output)
+        db_mock.session.commit.assert_called_once()
+
+    @patch('service.common.cli_commands.OutboxDispatcher')
+    def test_outbox_dispatch(self, dispatcher_mock):
+        """It should run the outbox dispatcher"""
+        with patch.dict(app.config, {"OUTBOX_SINK_URL": "http://localhost/events"}):
+            result = self.runner.invoke(outbox_dispatch)
+        self.assertEqual(result.exit_code, 0)
+        dispatcher_mock.return_value.run.assert_called_once()
+
+    def test_outbox_dispatch_without_sink(self):
+        """It should not run the outbox dispatcher without a sink"""
+        with patch.dict(app.config, {"OUTBOX_SINK_URL": None}):
+            result = self.runner.invoke(outbox_dispatch)
+        self.assertNotEqual(result.exit_code, 0)
+
+    @patch('service.common.cli_commands.create_partitions', return_value=["customer_2025_01"])
+    @patch('service.common.cli_commands.db')
+    def test_create_partitions(self, db_mock, create_mock):
+        """It should create partitions from the given month"""
+        with patch('service.common.cli_commands.PARTITION_BY', "range"):
+            result = self.runner.invoke(create_partitions_command, ["--months", "1", "--start", "2025-01-01"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("customer_2025_01", result.output)
+        create_mock.assert_called_once_with(db_mock.session.connection.return_value, date(2025, 1, 1), 1)
+        db_mock.session.commit.assert_called_once()
+
+    def test_create_partitions_unpartitioned(self):
+        """It should not create partitions for an unpartitioned table"""
+        with patch('service.common.cli_commands.PARTITION_BY', ""):
+            result = self.runner.invoke(create_partitions_command)
+        self.assertNotEqual(result.exit_code, 0)
@@ -0,0 +1,107 @@
+"""
+Test cases for Request Deadlines
+"""
+import logging
+import time
+from unittest import TestCase
+from unittest.mock import patch
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from wsgi import app
+from service.common import status
+from service.common.deadlines import DeadlineExceeded, route_timeout
+from service.models import db
+from tests.factories import CustomerFactory
+
+
+class TestDeadlines(TestCase):
+    """Request Deadline Tests"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["TESTING"] = True
+        app.logger.setLevel(logging.CRITICAL)
+
+    def setUp(self):
+        self.client = app.test_client()
+        # the engine itself, not the connection the test runs in
+        with app.app_context():
+            self.engine = db.engine.engine
+
+    def test_statement_timeout(self):
+        """It should give the transactions of a request the default statement timeout"""
+        with app.test_request_context("/customers"), self.engine.connect() as connection:
+            timeout = connection.execute(text("SHOW statement_timeout")).scalar()
+        self.assertEqual(timeout, f"{app.config['STATEMENT_TIMEOUT']:g}s")
+
+    def test_background_statement_timeout(self):
+        """It should not time out the statements of jobs and CLI commands"""
+        with app.app_context(), self.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SHOW statement_timeout")).scalar(), "0")
+            connection.rollback()
+            # the next transaction of the same connection is still not limited
+            self.assertEqual(connection.execute(text("SHOW statement_timeout")).scalar(), "0")
+
+    def test_route_timeout(self):
+        """It should look up the timeout of each endpoint"""
+        with patch.dict(app.config["ROUTE_TIMEOUTS"], {"list_customers": 2}):
+            self.assertEqual(route_timeout(app, "list_customers"), 2)
+        self.assertEqual(route_timeout(app, "get_customers"), app.config["STATEMENT_TIMEOUT"])
+
+    def test_route_statement_timeout(self):
+        """It should run the transactions of a route with its own timeout"""
+        with app.test_request_context("/customers"), self.engine.connect() as connection:
+            g.timeout = 0.25
+            self.assertEqual(connection.execute(text("SHOW statement_timeout")).scalar(), "250ms")
+            with self.assertRaises(DeadlineExceeded):
+                connection.execute(text("SELECT pg_sleep(1)"))
+
+    def test_deadline_passed(self):
+        """It should not send statements once the deadline has passed"""
+        with app.test_request_context("/customers"), self.engine.connect() as connection:
+            g.timeout = 1
+            g.deadline = time.monotonic() - 0.1
+            self.assertRaises(DeadlineExceeded, connection.execute, text("SELECT 1"))
+
+    def test_gateway_timeout(self):
+        """It should answer 504 when a request runs out of time"""
+        with patch.dict(app.config["ROUTE_TIMEOUTS"], {"list_customers": 1e-9}):
+            response = self.client.get("/customers")
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+        self.assertIn("list_customers ran out of time", response.get_json()["message"])
+
+    def test_write_gateway_timeout(self):
+        """It should answer 504 when a write runs out of time"""
+        data = CustomerFactory().serialize()
+        del data["id"]
+        writes = [
+            ("create_customers", "post", "/customers", data),
+            ("update_customers", "put", "/customers/1", data),
+            ("patch_customers", "patch", "/customers/1", {"name": "Late"}),
+            ("suspend_customer", "put", "/customers/1/suspend", None),
+            ("delete_customers", "delete", "/customers/1", None),
+        ]
+        for endpoint, method, url, body in writes:
+            with self.subTest(endpoint), patch.dict(app.config["ROUTE_TIMEOUTS"], {endpoint: 1e-9}):
+                response = getattr(self.client, method)(url, json=body)
+                self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+                self.assertIn(f"{endpoint} ran out of time", response.get_json()["message"])
+
+    def test_pool_timeout(self):
+        """It should answer 503 when no database connection is free"""
+        with patch("service.routes.Customer.fetch", side_effect=PoolTimeoutError("QueuePool limit reached")):
+            response = self.client.get("/customers")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.headers["Retry-After"], str(app.config["ADMISSION_RETRY_AFTER"]))
+
+    def test_write_pool_timeout(self):
+        """It should answer 503 when a write gets no database connection"""
+        data = CustomerFactory().serialize()
+        del data["id"]
+        with app.app_context(), patch.object(db.session, "execute", side_effect=PoolTimeoutError("QueuePool limit reached")):
+            for method, url in (("post", "/customers"), ("put", "/customers/1")):
+                with self.subTest(method):
+                    response = getattr(self.client, method)(url, json=data)
+                    self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+                    self.assertIn("No database connection available", response.get_json()["message"])
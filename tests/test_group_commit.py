@@ -0,0 +1,30 @@
+"""
+Test cases for Group Commit
+"""
+from unittest import TestCase
+from service.common.group_commit import GroupCommit
+
+
+class TestGroupCommit(TestCase):
+    """Group Commit Tests"""
+
+    def test_return_own_result(self):
+        """It should return the result for the submitted item"""
+        group_commit = GroupCommit(0)
+        self.assertEqual(group_commit.submit(3, lambda items: [i * 2 for i in items]), 6)
+
+    def test_raise_own_error(self):
+        """It should raise an error returned for the submitted item"""
+        group_commit = GroupCommit(0)
+        self.assertRaises(
+            KeyError, group_commit.submit, 1, lambda items: [KeyError(i) for i in items]
+        )
+
+    def test_flush_exception(self):
+        """It should raise a flush failure in every caller"""
+        def flush(items):
+            raise ValueError(items)
+
+        group_commit = GroupCommit(0)
+        self.assertRaises(ValueError, group_commit.submit, 1, flush)
+        self.assertIsNone(group_commit._pending)
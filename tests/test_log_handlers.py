@@ -0,0 +1,72 @@
+"""
+Test cases for the Log Handlers
+"""
+import atexit
+import logging
+from unittest import TestCase
+from flask import Flask
+from service.common.log_handlers import SamplingFilter, init_logging
+
+
+def make_record(level: int) -> logging.LogRecord:
+    """Creates a bare log record at the given level"""
+    return logging.LogRecord("test", level, __file__, 1, "message", None, None)
+
+
+class TestSamplingFilter(TestCase):
+    """Sampling Filter Tests"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def test_pass_everything_by_default(self):
+        """It should pass every record with a rate of 1"""
+        sampler = SamplingFilter()
+        with self.app.test_request_context():
+            results = [sampler.filter(make_record(logging.INFO)) for _ in range(10)]
+        self.assertTrue(all(results))
+
+    def test_sample_request_records(self):
+        """It should pass every Nth INFO record inside a request"""
+        sampler = SamplingFilter(5)
+        with self.app.test_request_context():
+            results = [sampler.filter(make_record(logging.INFO)) for _ in range(20)]
+        self.assertEqual(results.count(True), 4)
+
+    def test_never_sample_warnings(self):
+        """It should always pass warnings and errors"""
+        sampler = SamplingFilter(100)
+        with self.app.test_request_context():
+            self.assertTrue(sampler.filter(make_record(logging.WARNING)))
+            self.assertTrue(sampler.filter(make_record(logging.ERROR)))
+
+    def test_never_sample_outside_request(self):
+        """It should always pass records logged outside a request"""
+        sampler = SamplingFilter(100)
+        self.assertTrue(sampler.filter(make_record(logging.INFO)))
+
+
+class TestInitLogging(TestCase):
+    """Logging Setup Tests"""
+
+    def test_background_writer(self):
+        """It should write log records through a background listener"""
+        app = Flask(__name__)
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        source = logging.getLogger("test.init_logging")
+        source.setLevel(logging.INFO)
+        source.handlers = [handler]
+
+        init_logging(app, "test.init_logging")
+        listener = app.extensions["log_listener"]
+        app.logger.info("Hello %s", "world")
+        listener.stop()
+        atexit.unregister(listener.stop)
+
+        self.assertIsNotNone(handler.formatter)
+        self.assertEqual(
+            [record.getMessage() for record in records],
+            ["Logging handler established", "Hello world"],
+        )
@@ -4,11 +4,18 @@ Test cases for Customer Model
 
 import os
 import logging
+import threading
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from datetime import date
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from wsgi import app
-from service.models import Customer, DataValidationError, db
+from service.models import Customer, DataValidationError, IdempotencyKeyTaken, VersionConflictError, db
+from service.models import create_initial_partitions, create_partitions, month_partitions
+from service.common.deadlines import DeadlineExceeded
+from service.common.group_commit import GroupCommit
 from .factories import CustomerFactory
 
 DATABASE_URI = os.getenv(
@@ -37,11 +44,6 @@ class TestCaseBase(TestCase):
         """This runs once after the entire test suite"""
         db.session.close()
 
-    def setUp(self):
-        """This runs before each test"""
-        db.session.query(Customer).delete()  # clean up the last tests
-        db.session.commit()
-
     def tearDown(self):
         """This runs after each test"""
         db.session.remove()
@@ -118,6 +120,57 @@ class TestCaseBase(TestCase):
         customer.delete()
         self.assertEqual(len(Customer.all()), 0)
 
+    def test_update_by_id(self):
+        """It should Update a Customer in a single statement"""
+        customer = CustomerFactory()
+        customer.create()
+        updated = Customer.update_by_id(customer.id, {"name": "Ryan"}, version=1)
+        self.assertEqual(updated.name, "Ryan")
+        self.assertEqual(updated.version, 2)
+        self.assertEqual(updated.address, customer.address)
+        self.assertIsNone(Customer.update_by_id(0, {"name": "Ryan"}))
+
+    def test_update_by_id_stale_version(self):
+        """It should not Update a Customer that changed since it was read"""
+        customer = CustomerFactory()
+        customer.create()
+        Customer.update_by_id(customer.id, {"name": "Ryan"})
+        self.assertRaises(
+            VersionConflictError, Customer.update_by_id, customer.id, {"name": "Ben"}, 1
+        )
+        self.assertIsNone(Customer.update_by_id(0, {"name": "Ben"}, 1))
+        self.assertEqual(Customer.find(customer.id).name, "Ryan")
+
+    def test_update_bumps_version(self):
+        """It should bump the version when saving a Customer"""
+        customer = CustomerFactory()
+        customer.create()
+        customer.name = "Ryan"
+        customer.update()
+        self.assertEqual(customer.version, 2)
+
+    def test_delete_by_id(self):
+        """It should Delete a Customer in a single statement"""
+        customer = CustomerFactory()
+        customer.create()
+        customer_id = customer.id
+        self.assertTrue(Customer.delete_by_id(customer_id))
+        self.assertFalse(Customer.delete_by_id(customer_id))
+        self.assertEqual(len(Customer.all()), 0)
+
+    def test_member_since_hint(self):
+        """It should only Find, Update and Delete a Customer who joined on the hinted date"""
+        customer = CustomerFactory(member_since=date(2020, 5, 17))
+        customer.create()
+        wrong = date(2020, 5, 18)
+        self.assertIsNone(Customer.find(customer.id, wrong))
+        self.assertEqual(Customer.find(customer.id, customer.member_since).id, customer.id)
+        self.assertIsNone(Customer.update_by_id(customer.id, {"name": "Ryan"}, 1, member_since=wrong))
+        updated = Customer.update_by_id(customer.id, {"name": "Ryan"}, 1, member_since=customer.member_since)
+        self.assertEqual(updated.name, "Ryan")
+        self.assertFalse(Customer.delete_by_id(customer.id, wrong))
+        self.assertTrue(Customer.delete_by_id(customer.id, customer.member_since))
+
     def test_serialize_a_customer(self):
         """It should serialize a Customer"""
         customer = CustomerFactory()
@@ -159,6 +212,16 @@ class TestCaseBase(TestCase):
         customer = Customer()
         self.assertRaises(DataValidationError, customer.deserialize, data)
 
+    def test_deserialize_every_error(self):
+        """It should report every problem with a Customer at once"""
+        data = CustomerFactory().serialize()
+        data.update(name="x" * 64, email="nobody", member_since="someday")
+        del data["address"]
+        with self.assertRaises(DataValidationError) as context:
+            Customer().deserialize(data)
+        self.assertEqual(len(context.exception.errors), 4)
+        self.assertIn("name must be at most 63 characters", str(context.exception))
+
     def test_deserialize_bad_data(self):
         """It should not deserialize bad data"""
         data = "this is not a dictionary"
@@ -206,6 +269,42 @@ class TestExceptionHandlers(TestCaseBase):
         customer = CustomerFactory()
         self.assertRaises(DataValidationError, customer.delete)
 
+    @patch("service.models.db.session.commit")
+    def test_update_by_id_exception(self, exception_mock):
+        """It should catch an update by id exception"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, Customer.update_by_id, 1, {"name": "Ryan"})
+
+    @patch("service.models.db.session.commit")
+    def test_delete_by_id_exception(self, exception_mock):
+        """It should catch a delete by id exception"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, Customer.delete_by_id, 1)
+
+    @patch("service.models.db.session.commit")
+    def test_unavailable_passed_on(self, exception_mock):
+        """It should pass on deadline and pool timeout errors unwrapped"""
+
+        def stored():
+            side_effect, exception_mock.side_effect = exception_mock.side_effect, None
+            customer = CustomerFactory()
+            customer.create()
+            exception_mock.side_effect = side_effect
+            return customer
+
+        writes = [
+            lambda: CustomerFactory().create(),
+            lambda: stored().update(),
+            lambda: stored().delete(),
+            lambda: Customer.update_by_id(1, {"name": "Ryan"}),
+            lambda: Customer.update_many([1], {"status": "suspended"}),
+            lambda: Customer.delete_by_id(1),
+        ]
+        for error in (DeadlineExceeded("out of time"), PoolTimeoutError("QueuePool limit reached")):
+            exception_mock.side_effect = error
+            for write in writes:
+                self.assertRaises(type(error), write)
+
 
 ######################################################################
 #  Q U E R Y   T E S T   C A S E S
@@ -231,6 +330,26 @@ class TestModelQueries(TestCaseBase):
         self.assertEqual(customer.phone_number, customers[1].phone_number)
         self.assertEqual(customer.member_since, customers[1].member_since)
 
+    def test_find_many_customers(self):
+        """It should Find many Customers with one query"""
+        customers = CustomerFactory.create_batch(3)
+        for customer in customers:
+            customer.create()
+        ids = [customer.id for customer in customers]
+        found = Customer.find_many(ids + [0])
+        self.assertEqual(sorted(found), sorted(ids))
+        self.assertEqual(found[ids[1]].name, customers[1].name)
+
+    def test_find_many_loaded_customers(self):
+        """It should not read Customers already loaded in the session"""
+        customer = CustomerFactory()
+        customer.create()
+        db.session.refresh(customer)
+        with patch.object(db.session, "scalars") as scalars:
+            found = Customer.find_many([customer.id])
+        scalars.assert_not_called()
+        self.assertIs(found[customer.id], customer)
+
     def test_find_all_customers(self):
         """It should Find All Customers"""
         customers = CustomerFactory.create_batch(10)
@@ -247,8 +366,8 @@ class TestModelQueries(TestCaseBase):
             customer.create()
         name = customers[0].name
         count = len([customer for customer in customers if customer.name == name])
-        found = Customer.find_by_name(name)
-        self.assertEqual(found.count(), count)
+        found = Customer.fetch(Customer.find_by_name(name))
+        self.assertEqual(len(found), count)
         for customer in found:
             self.assertEqual(customer.name, name)
 
@@ -259,8 +378,8 @@ class TestModelQueries(TestCaseBase):
             customer.create()
         address = customers[0].address
         count = len([customer for customer in customers if customer.address == address])
-        found = Customer.find_by_address(address)
-        self.assertEqual(found.count(), count)
+        found = Customer.fetch(Customer.find_by_address(address))
+        self.assertEqual(len(found), count)
         for customer in found:
             self.assertEqual(customer.address, address)
 
@@ -271,8 +390,8 @@ class TestModelQueries(TestCaseBase):
             customer.create()
         email = customers[0].email
         count = len([customer for customer in customers if customer.email == email])
-        found = Customer.find_by_email(email)
-        self.assertEqual(found.count(), count)
+        found = Customer.fetch(Customer.find_by_email(email))
+        self.assertEqual(len(found), count)
         for customer in found:
             self.assertEqual(customer.email, email)
 
@@ -283,8 +402,8 @@ class TestModelQueries(TestCaseBase):
             customer.create()
         phone_number = customers[0].phone_number
         count = len([customer for customer in customers if customer.phone_number == phone_number])
-        found = Customer.find_by_phone(phone_number)
-        self.assertEqual(found.count(), count)
+        found = Customer.fetch(Customer.find_by_phone(phone_number))
+        self.assertEqual(len(found), count)
         for customer in found:
             self.assertEqual(customer.phone_number, phone_number)
 
@@ -295,7 +414,233 @@ class TestModelQueries(TestCaseBase):
             customer.create()
         member_since = customers[0].member_since
         count = len([customer for customer in customers if customer.member_since == member_since])
-        found = Customer.find_by_member_since(member_since)
-        self.assertEqual(found.count(), count)
+        found = Customer.fetch(Customer.find_by_member_since(member_since))
+        self.assertEqual(len(found), count)
         for customer in found:
             self.assertEqual(customer.member_since, member_since)
+
+    def test_prepared_statements(self):
+        """It should let psycopg prepare statements that run repeatedly"""
+        connection = db.session.connection().connection.driver_connection
+        expected = app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"]["prepare_threshold"]
+        self.assertEqual(connection.prepare_threshold, expected)
+
+    def test_fetch_query(self):
+        """It should Fetch the results of a query as a list"""
+        customers = CustomerFactory.create_batch(3)
+        for customer in customers:
+            customer.create()
+        name = customers[0].name
+        found = Customer.fetch(Customer.find_by_name(name))
+        self.assertIsInstance(found, list)
+        self.assertEqual(len(found), len([customer for customer in customers if customer.name == name]))
+
+    def test_coalesce_shared_results(self):
+        """It should merge shared results into the caller's session"""
+        customer = CustomerFactory()
+        customer.create()
+        db.session.refresh(customer)
+        db.session.expunge(customer)
+        with patch("service.models.reads.do") as do_mock:
+            do_mock.return_value = (customer, True)
+            found = Customer.find(customer.id)
+            self.assertIsNot(found, customer)
+            self.assertIn(found, db.session)
+            self.assertEqual(found.name, customer.name)
+
+            do_mock.return_value = ([customer], True)
+            found = Customer.all()
+            self.assertEqual([c.id for c in found], [customer.id])
+            self.assertIn(found[0], db.session)
+
+            do_mock.return_value = (None, True)
+            self.assertIsNone(Customer.find(0))
+
+
+######################################################################
+#  G R O U P   C O M M I T   T E S T   C A S E S
+######################################################################
+@pytest.mark.commits
+class TestGroupCommit(TestCaseBase):
+    """Customer Group Commit Tests"""
+
+    def tearDown(self):
+        app.extensions.pop("group_commit", None)
+        super().tearDown()
+
+    def create_concurrently(self, customers: list) -> list:
+        """Creates each Customer from its own thread and app context"""
+        errors = []
+        started = threading.Barrier(len(customers))
+
+        def worker(customer):
+            with app.app_context():
+                started.wait(5)
+                try:
+                    customer.create()
+                    customer.serialize()
+                except DataValidationError as error:
+                    errors.append(error)
+
+        threads = [threading.Thread(target=worker, args=(c,)) for c in customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return errors
+
+    def test_create_in_one_transaction(self):
+        """It should insert concurrent creates in one batch"""
+        app.extensions["group_commit"] = GroupCommit(0.5, 10)
+        customers = CustomerFactory.create_batch(4)
+        with patch.object(Customer, "insert_batch", wraps=Customer.insert_batch) as batch_mock:
+            errors = self.create_concurrently(customers)
+        self.assertEqual(errors, [])
+        self.assertEqual(batch_mock.call_count, 1)
+        self.assertEqual(len({customer.id for customer in customers}), 4)
+        found = Customer.all()
+        self.assertEqual(len(found), 4)
+        self.assertTrue(all(customer.status == "active" for customer in found))
+
+    def test_create_with_bad_row(self):
+        """It should only fail the Customers that could not be inserted"""
+        app.extensions["group_commit"] = GroupCommit(0.5, 10)
+        customers = CustomerFactory.create_batch(3)
+        customers[1].email = None
+        errors = self.create_concurrently(customers)
+        self.assertEqual(len(errors), 1)
+        self.assertIsNotNone(customers[0].id)
+        self.assertIsNone(customers[1].id)
+        self.assertIsNotNone(customers[2].id)
+        self.assertEqual(len(Customer.all()), 2)
+
+    def test_create_full_batch(self):
+        """It should flush as soon as the batch is full"""
+        app.extensions["group_commit"] = GroupCommit(60, 1)
+        customer = CustomerFactory()
+        customer.create()
+        self.assertIsNotNone(customer.id)
+        self.assertEqual(customer.serialize()["status"], "active")
+        self.assertEqual(Customer.find(customer.id).name, customer.name)
+
+    @patch("service.models.db.session.commit")
+    def test_create_commit_exception(self, exception_mock):
+        """It should fail every Customer in a batch that cannot commit"""
+        exception_mock.side_effect = Exception()
+        app.extensions["group_commit"] = GroupCommit(0, 10)
+        customer = CustomerFactory()
+        self.assertRaises(DataValidationError, customer.create)
+
+    def test_create_idempotent(self):
+        """It should create a Customer and its Idempotency-Key outside of a batch"""
+        app.extensions["group_commit"] = GroupCommit(60, 10)
+        customer = CustomerFactory()
+        with patch.object(Customer, "insert_batch") as batch_mock:
+            customer.create(("key-1", "fingerprint"))
+            self.assertRaises(IdempotencyKeyTaken, CustomerFactory().create, ("key-1", "fingerprint"))
+            # the duplicate gave up before it inserted, so it used no id
+            later = CustomerFactory()
+            later.create(("key-2", "fingerprint"))
+        batch_mock.assert_not_called()
+        self.assertEqual(later.id, customer.id + 1)
+        self.assertEqual([found.id for found in Customer.all()], [customer.id, later.id])
+
+    @patch("service.models.db.session.commit")
+    def test_create_commit_timeout(self, exception_mock):
+        """It should pass on a deadline that runs out while a batch commits"""
+        exception_mock.side_effect = DeadlineExceeded("out of time")
+        app.extensions["group_commit"] = GroupCommit(0, 10)
+        customer = CustomerFactory()
+        self.assertRaises(DeadlineExceeded, customer.create)
+
+
+######################################################################
+#  P A R T I T I O N   T E S T   C A S E S
+######################################################################
+class TestPartitions(TestCase):
+    """Customer Table Partitioning Tests"""
+
+    def test_month_partitions(self):
+        """It should name and bound a partition for each month"""
+        partitions = month_partitions(date(2024, 11, 1), 3)
+        self.assertEqual(
+            partitions,
+            [
+                ("customer_2024_11", date(2024, 11, 1), date(2024, 12, 1)),
+                ("customer_2024_12", date(2024, 12, 1), date(2025, 1, 1)),
+                ("customer_2025_01", date(2025, 1, 1), date(2025, 2, 1)),
+            ],
+        )
+
+    @patch("service.models.PARTITION_BY", "range")
+    def test_range_partitions(self):
+        """It should partition a customer table by member_since month"""
+        today = date.today()
+        with app.app_context():
+            connection = db.session.connection()
+            # a partitioned copy of the customer table in a schema of its own
+            schema = connection.execute(text("SELECT current_schema()")).scalar()
+            connection.execute(text(f"CREATE SCHEMA {schema}_partitions"))
+            connection.execute(text(f"SET LOCAL search_path TO {schema}_partitions"))
+            connection.execute(
+                text(
+                    f"CREATE TABLE customer (LIKE {schema}.customer INCLUDING DEFAULTS, "
+                    "PRIMARY KEY (id, member_since)) PARTITION BY RANGE (member_since)"
+                )
+            )
+            with patch("service.models.PARTITION_START", f"{today.year - 1}-{today.month:02}-15"):
+                create_initial_partitions(None, connection)
+            self.assertEqual(self.count_partitions(connection), 25)
+
+            def partition_of(customer_id, member_since):
+                connection.execute(
+                    text(
+                        "INSERT INTO customer (id, name, address, email, phone_number, member_since, "
+                        "created_at, last_updated, status, version) VALUES (:id, 'Ada', 'Here', "
+                        "'ada@example.com', '555-1212', :member_since, now(), now(), 'active', 1)"
+                    ),
+                    {"id": customer_id, "member_since": member_since},
+                )
+                return connection.execute(
+                    text("SELECT tableoid::regclass::text FROM customer WHERE id = :id"), {"id": customer_id}
+                ).scalar()
+
+            # history lands in the default partition until its month is added
+            self.assertEqual(partition_of(1, date(2019, 3, 15)), "customer_default")
+            names = create_partitions(connection, date(2019, 1, 1), 12)
+            self.assertEqual(names, [f"customer_2019_{month:02}" for month in range(1, 13)])
+            self.assertEqual(partition_of(2, date(2019, 3, 1)), "customer_2019_03")
+            self.assertEqual(
+                connection.execute(text("SELECT tableoid::regclass::text FROM customer WHERE id = 1")).scalar(),
+                "customer_2019_03",
+            )
+
+            # months the default partition holds rows of get their own
+            self.assertEqual(partition_of(3, date(2015, 6, 30)), "customer_default")
+            self.assertEqual(create_partitions(connection), ["customer_2015_06"])
+            plan = connection.execute(text("EXPLAIN SELECT * FROM customer WHERE member_since = '2015-06-30'")).scalars().all()
+            self.assertIn("customer_2015_06", " ".join(plan))
+            self.assertNotIn("customer_default", " ".join(plan))
+
+    @staticmethod
+    def count_partitions(connection) -> int:
+        """Counts the partitions of the customer table"""
+        return connection.execute(
+            text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'customer'::regclass")
+        ).scalar()
+
+    @patch("service.models.HASH_PARTITIONS", 4)
+    @patch("service.models.PARTITION_BY", "hash")
+    def test_hash_partitions(self):
+        """It should create every hash partition"""
+        connection = MagicMock()
+        names = create_partitions(connection)
+        self.assertEqual(names, ["customer_p0", "customer_p1", "customer_p2", "customer_p3"])
+        self.assertIn("MODULUS 4, REMAINDER 3", str(connection.execute.call_args[0][0]))
+
+    @patch("service.models.PARTITION_BY", "")
+    def test_no_partitions(self):
+        """It should create nothing for an unpartitioned table"""
+        connection = MagicMock()
+        self.assertEqual(create_partitions(connection), [])
+        connection.execute.assert_not_called()
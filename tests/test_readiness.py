@@ -0,0 +1,72 @@
+"""
+Test cases for the Readiness Check
+"""
+import logging
+from unittest import TestCase
+from unittest.mock import patch
+import pytest
+from sqlalchemy.exc import OperationalError
+from wsgi import app
+from service.common import status
+from service.models import db
+
+
+@pytest.mark.commits  # so that the pool is the real one
+class TestReadiness(TestCase):
+    """Readiness Check Tests"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["TESTING"] = True
+        app.logger.setLevel(logging.CRITICAL)
+
+    def setUp(self):
+        self.client = app.test_client()
+        app.extensions["readiness_cache"].clear()
+
+    def test_ready(self):
+        """It should be ready when the database answers"""
+        response = self.client.get("/ready")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.cache_control.no_store)
+        data = response.get_json()
+        self.assertEqual(data["message"], "Ready")
+        self.assertTrue(data["database"]["ok"])
+        self.assertIn("latency_ms", data["database"])
+        self.assertEqual(set(data["pool"]), {"size", "checked_out", "overflow", "saturation"})
+        self.assertEqual(data["admission"]["limit"], app.config["ADMISSION_MAX_CONCURRENCY"])
+
+    def test_cache_ping(self):
+        """It should ping the database once per cache interval"""
+        with patch("service.common.readiness.ping_database", return_value={"ok": True}) as ping:
+            self.client.get("/ready")
+            self.client.get("/ready")
+        self.assertEqual(ping.call_count, 1)
+
+    def test_database_down(self):
+        """It should not be ready when the database does not answer"""
+        error = OperationalError("SELECT 1", {}, Exception("connection refused"))
+        with patch.object(db.session, "execute", side_effect=error):
+            response = self.client.get("/ready")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        data = response.get_json()
+        self.assertEqual(data["message"], "Not Ready")
+        self.assertFalse(data["database"]["ok"])
+        self.assertIn("connection refused", data["database"]["error"])
+
+    def test_pool_saturated(self):
+        """It should not be ready while the pool is saturated, if asked to"""
+        with app.app_context():
+            pool = db.engine.pool
+        with patch.object(pool, "checkedout", return_value=pool.size()):
+            self.assertEqual(self.client.get("/ready").status_code, status.HTTP_200_OK)
+            with patch.dict(app.config, {"READINESS_MAX_SATURATION": 0.9}):
+                response = self.client.get("/ready")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.get_json()["pool"]["saturation"], 1)
+
+    def test_not_admission_controlled(self):
+        """It should answer even when the worker is turning requests away"""
+        controller = app.extensions["admission"]
+        with patch.multiple(controller, in_flight=controller.max_concurrency, max_wait=0):
+            self.assertEqual(self.client.get("/ready").status_code, status.HTTP_200_OK)
@@ -3,13 +3,18 @@ TestCustomer API Service Test Suite
 """
 
 import os
+import gzip
 import logging
-from unittest import TestCase
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
 from datetime import date
 from urllib.parse import quote_plus
+from flask import Response
+import pytest
 from wsgi import app
 from service.common import status
-from service.models import db, Customer
+from service.common.compression import brotli, compress_response, zstandard
+from service.models import db, Customer, IdempotencyKey
 from .factories import CustomerFactory
 
 DATABASE_URI = os.getenv(
@@ -43,8 +48,6 @@ class TestCustomerResource(TestCase):
     def setUp(self):
         """Runs before each test"""
         self.client = app.test_client()
-        db.session.query(Customer).delete()  # clean up the last tests
-        db.session.commit()
 
     def tearDown(self):
         """This runs after each test"""
@@ -130,6 +133,73 @@ class TestCustomerResource(TestCase):
             new_customer["member_since"], test_customer.member_since.isoformat()
         )
 
+    def test_create_customer_idempotent(self):
+        """It should replay a Create sent again with the same Idempotency-Key"""
+        test_customer = CustomerFactory()
+        headers = {"Idempotency-Key": "create-1"}
+        first = self.client.post(BASE_URL, json=test_customer.serialize(), headers=headers)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", first.headers)
+
+        retry = self.client.post(BASE_URL, json=test_customer.serialize(), headers=headers)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.headers["Location"], first.headers["Location"])
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(len(self.client.get(BASE_URL).get_json()), 1)
+
+    def test_create_customer_idempotent_race(self):
+        """It should replay a Create whose Idempotency-Key was taken while it ran"""
+        data = CustomerFactory().serialize()
+        headers = {"Idempotency-Key": "create-4"}
+        first = self.client.post(BASE_URL, json=data, headers=headers)
+        # the retry misses the first lookup, as if both requests ran at once
+        lookups = [None]
+        find = IdempotencyKey.find
+        with patch.object(IdempotencyKey, "find", side_effect=lambda key: lookups.pop() if lookups else find(key)):
+            retry = self.client.post(BASE_URL, json=data, headers=headers)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(len(self.client.get(BASE_URL).get_json()), 1)
+
+    def test_create_customer_idempotency_key_expired(self):
+        """It should create another Customer once an Idempotency-Key has expired"""
+        data = CustomerFactory().serialize()
+        headers = {"Idempotency-Key": "create-5"}
+        first = self.client.post(BASE_URL, json=data, headers=headers)
+        with patch.dict(app.config, {"IDEMPOTENCY_TTL": 0}):
+            retry = self.client.post(BASE_URL, json=data, headers=headers)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", retry.headers)
+        self.assertNotEqual(retry.get_json()["id"], first.get_json()["id"])
+        self.assertEqual(IdempotencyKey.find("create-5").customer_id, retry.get_json()["id"])
+
+    def test_create_customer_idempotency_key_reused(self):
+        """It should not accept an Idempotency-Key reused for a different Customer"""
+        headers = {"Idempotency-Key": "create-2"}
+        response = self.client.post(BASE_URL, json=CustomerFactory().serialize(), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(BASE_URL, json=CustomerFactory().serialize(), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_create_customer_idempotency_key_too_long(self):
+        """It should not accept an Idempotency-Key that is too long"""
+        headers = {"Idempotency-Key": "k" * 256}
+        response = self.client.post(BASE_URL, json=CustomerFactory().serialize(), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_customer_idempotent_bad_data(self):
+        """It should not remember a failed Create for its Idempotency-Key"""
+        headers = {"Idempotency-Key": "create-3"}
+        data = CustomerFactory().serialize()
+        del data["name"]
+        response = self.client.post(BASE_URL, json=data, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data["name"] = "Jane"
+        response = self.client.post(BASE_URL, json=data, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     def test_read_customer(self):
         """It should read an existing Customer"""
         test_customer = CustomerFactory()
@@ -194,6 +264,29 @@ class TestCustomerResource(TestCase):
         updated_customer = response.get_json()
         self.assertEqual(updated_customer["name"], "Ryan")
 
+    def test_update_customer_version(self):
+        """It should only Update a Customer at the version that was read"""
+        new_customer = self._create_customer(1)[0].serialize()
+        new_customer["version"] = 1
+        new_customer["name"] = "Ryan"
+        response = self.client.put(f"{BASE_URL}/{new_customer['id']}", json=new_customer)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["version"], 2)
+
+        # a second writer still holding version 1 must not overwrite it
+        new_customer["name"] = "Ben"
+        response = self.client.put(f"{BASE_URL}/{new_customer['id']}", json=new_customer)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.get(f"{BASE_URL}/{new_customer['id']}")
+        self.assertEqual(response.get_json()["name"], "Ryan")
+
+    def test_update_customer_bad_version(self):
+        """It should not Update a Customer with a version that is not an integer"""
+        new_customer = self._create_customer(1)[0].serialize()
+        new_customer["version"] = "one"
+        response = self.client.put(f"{BASE_URL}/{new_customer['id']}", json=new_customer)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_update_non_existing_customer(self):
         """It should not update a non-existent Customer"""
 
@@ -211,6 +304,37 @@ class TestCustomerResource(TestCase):
         response = self.client.put(f"{BASE_URL}/{non_existent_id}", json=new_customer)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_patch_customer(self):
+        """It should Update only the fields sent in a Patch"""
+        customer = self._create_customer(1)[0]
+        response = self.client.patch(
+            f"{BASE_URL}/{customer.id}", json={"phone_number": "555-0100", "member_since": "2020-02-29"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(data["phone_number"], "555-0100")
+        self.assertEqual(data["member_since"], "2020-02-29")
+        self.assertEqual(data["name"], customer.name)
+        self.assertEqual(data["email"], customer.email)
+        self.assertEqual(data["version"], 2)
+
+        response = self.client.patch(f"{BASE_URL}/{customer.id}", json={"name": "Ryan", "version": 1})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_patch_customer_bad_data(self):
+        """It should not Patch a Customer with bad or missing fields"""
+        customer = self._create_customer(1)[0]
+        for body in ({}, {"id": 5}, {"name": None}, {"member_since": "yesterday"}, ["name"]):
+            response = self.client.patch(f"{BASE_URL}/{customer.id}", json=body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        response = self.client.patch(f"{BASE_URL}/{customer.id}", json={"name": "Ryan", "version": "1"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_patch_non_existing_customer(self):
+        """It should not Patch a non-existent Customer"""
+        response = self.client.patch(f"{BASE_URL}/0", json={"name": "Ryan"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     # ----------------------------------------------------------
     # TEST LIST
     # ----------------------------------------------------------
@@ -235,6 +359,28 @@ class TestCustomerResource(TestCase):
         response = self.client.get(f"{BASE_URL}/{test_customer.id}")
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_member_since_hint(self):
+        """It should only touch a Customer who joined on the member_since hint"""
+        test_customer = self._create_customer(1)[0]
+        url = f"{BASE_URL}/{test_customer.id}"
+        right = {"member_since": test_customer.member_since.isoformat()}
+        wrong = {"member_since": "1999-01-01"}
+        data = test_customer.serialize()
+        for method, body in (("get", None), ("put", data)):
+            with self.subTest(method):
+                response = getattr(self.client, method)(url, json=body, query_string=wrong)
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                response = getattr(self.client, method)(url, json=body, query_string=right)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.put(f"{url}/suspend", query_string=wrong)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(url, query_string={"member_since": "soon"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.delete(url, query_string=wrong)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.client.delete(url, query_string=right)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
     def test_delete_non_existing_customer(self):
         """It should Delete a Customer even if it doesn't exist"""
         # make sure the customer you are deleting does not exist
@@ -339,6 +485,171 @@ class TestCustomerResource(TestCase):
         for customer in data:
             self.assertEqual(customer["member_since"], member_since_str)
 
+    def test_query_by_status(self):
+        """It should Query Customers by status"""
+        customers = self._create_customer(3)
+        self.client.put(f"{BASE_URL}/{customers[0].id}/suspend")
+        response = self.client.get(BASE_URL, query_string="status=suspended")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual([customer["id"] for customer in data], [customers[0].id])
+        response = self.client.get(BASE_URL, query_string="status=active")
+        self.assertEqual(len(response.get_json()), 2)
+
+    def test_query_by_member_since_range(self):
+        """It should Query Customers who joined within a range of dates"""
+        customers = []
+        for member_since in ("2022-12-31", "2023-01-01", "2023-06-15", "2023-12-31", "2024-01-01"):
+            customer = CustomerFactory(member_since=date.fromisoformat(member_since))
+            response = self.client.post(BASE_URL, json=customer.serialize())
+            customers.append(response.get_json())
+        self.client.put(f"{BASE_URL}/{customers[2]['id']}/suspend")
+        response = self.client.get(
+            BASE_URL, query_string="member_since_from=2023-01-01&member_since_to=2023-12-31"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(customer["member_since"] for customer in response.get_json()),
+            ["2023-01-01", "2023-06-15", "2023-12-31"],
+        )
+        response = self.client.get(
+            BASE_URL, query_string="status=suspended&member_since_from=2023-01-01&member_since_to=2023-12-31"
+        )
+        self.assertEqual([customer["id"] for customer in response.get_json()], [customers[2]["id"]])
+        response = self.client.get(BASE_URL, query_string="member_since_from=2023-12-31")
+        self.assertEqual(len(response.get_json()), 2)
+
+    def test_query_bad_member_since_range(self):
+        """It should not Query Customers with an invalid date"""
+        response = self.client.get(BASE_URL, query_string="member_since_from=last-year")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sort_customers(self):
+        """It should List Customers sorted by an indexed column"""
+        for name in ("carol", "alice", "bob"):
+            self.client.post(BASE_URL, json=CustomerFactory(name=name).serialize())
+        response = self.client.get(BASE_URL, query_string="sort=name")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [customer["name"] for customer in response.get_json()]
+        self.assertEqual(names, sorted(names))
+        self.assertNotIn("Link", response.headers)
+        response = self.client.get(BASE_URL, query_string="sort=-name")
+        self.assertEqual([customer["name"] for customer in response.get_json()], names[::-1])
+
+    def test_sort_customers_in_pages(self):
+        """It should page through sorted Customers with a keyset cursor"""
+        for member_since in ("2023-05-01", "2023-01-01", "2023-05-01", "2023-03-01", "2023-02-01"):
+            customer = CustomerFactory(member_since=date.fromisoformat(member_since))
+            self.client.post(BASE_URL, json=customer.serialize())
+        expected = sorted(
+            ((customer.member_since.isoformat(), customer.id) for customer in Customer.all()),
+            reverse=True,
+        )
+        pages = []
+        query_string = {"sort": "-member_since", "limit": 2}
+        while True:
+            response = self.client.get(BASE_URL, query_string=query_string)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([(customer["member_since"], customer["id"]) for customer in response.get_json()])
+            if "Link" not in response.headers:
+                break
+            next_url = response.headers["Link"].split(">")[0].lstrip("<")
+            query_string = next_url.split("?", 1)[1]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([row for page in pages for row in page], expected)
+
+    def test_limit_customers(self):
+        """It should List a page of Customers in id order"""
+        customers = self._create_customer(3)
+        response = self.client.get(BASE_URL, query_string="limit=2")
+        self.assertEqual([customer["id"] for customer in response.get_json()], [c.id for c in customers[:2]])
+        self.assertIn('rel="next"', response.headers["Link"])
+        response = self.client.get(BASE_URL, query_string="sort=last_updated")
+        self.assertEqual(len(response.get_json()), 3)
+
+    def test_sort_customers_bad_request(self):
+        """It should not List Customers with an unknown sort or bad cursor"""
+        response = self.client.get(BASE_URL, query_string="sort=address")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="sort=name&after=bm90LWpzb24=")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(BASE_URL, query_string="sort=id&after=WzEsIDJd")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # ----------------------------------------------------------
+    # TEST BATCH GET
+    # ----------------------------------------------------------
+    def test_batch_get_customers(self):
+        """It should Read a batch of Customers in the order asked for"""
+        customers = self._create_customer(3)
+        ids = [customers[2].id, 0, customers[0].id, customers[2].id]
+        response = self.client.post(f"{BASE_URL}:batchGet", json={"ids": ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(
+            [customer["id"] for customer in data["customers"]],
+            [customers[2].id, customers[0].id, customers[2].id],
+        )
+        self.assertEqual(data["customers"][1]["name"], customers[0].name)
+        self.assertEqual(data["missing"], [0])
+
+    def test_batch_get_bad_request(self):
+        """It should not Read a batch of Customers without a list of ids"""
+        for body in (
+            {}, {"ids": []}, {"ids": "1,2"}, {"ids": [1, "2"]}, {"ids": [True]}, {"ids": list(range(1001))}, [1, 2], "x"
+        ):
+            response = self.client.post(f"{BASE_URL}:batchGet", json=body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        response = self.client.post(f"{BASE_URL}:batchGet", data="ids=1", content_type="text/plain")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    # ----------------------------------------------------------
+    # TEST STATS
+    # ----------------------------------------------------------
+    def test_customer_stats(self):
+        """It should count Customers by status and sign-ups by period"""
+        customers = []
+        for member_since in ("2023-01-02", "2023-01-31", "2023-03-01"):
+            customer = CustomerFactory(member_since=date.fromisoformat(member_since))
+            customers.append(self.client.post(BASE_URL, json=customer.serialize()).get_json())
+        self.client.put(f"{BASE_URL}/{customers[0]['id']}/suspend")
+
+        response = self.client.get(f"{BASE_URL}/stats")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.get_json()
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(data["by_status"], {"active": 2, "suspended": 1})
+        self.assertEqual(
+            data["signups"],
+            [{"period": "2023-01-01", "count": 2}, {"period": "2023-03-01", "count": 1}],
+        )
+        self.assertIsNone(response.cache_control.max_age)
+
+        response = self.client.get(f"{BASE_URL}/stats", query_string="bucket=day")
+        self.assertEqual(len(response.get_json()["signups"]), 3)
+        response = self.client.get(f"{BASE_URL}/stats", query_string="bucket=week")
+        self.assertEqual(response.get_json()["signups"][0], {"period": "2023-01-02", "count": 1})
+
+    def test_customer_stats_bad_bucket(self):
+        """It should not return stats for an unknown bucket"""
+        response = self.client.get(f"{BASE_URL}/stats", query_string="bucket=year")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_customer_stats_cache(self):
+        """It should serve stats from a short-lived cache"""
+        cache = app.extensions["stats_cache"]
+        with patch.object(cache, "ttl", 30):
+            try:
+                self._create_customer(1)
+                response = self.client.get(f"{BASE_URL}/stats")
+                self.assertEqual(response.get_json()["total"], 1)
+                self.assertEqual(response.cache_control.max_age, 30)
+                self._create_customer(1)
+                response = self.client.get(f"{BASE_URL}/stats")
+                self.assertEqual(response.get_json()["total"], 1)
+            finally:
+                cache.clear()
+
     # ----------------------------------------------------------
     # TEST SUSPEND
     # ----------------------------------------------------------
@@ -358,6 +669,122 @@ class TestCustomerResource(TestCase):
         suspended_customer = response.get_json()
         self.assertEqual(suspended_customer["status"], "suspended")
 
+    def test_suspend_non_existing_customer(self):
+        """It should not suspend a Customer that does not exist"""
+        response = self.client.put(f"{BASE_URL}/0/suspend")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    # ----------------------------------------------------------
+    # TEST CHANGE FEED
+    # ----------------------------------------------------------
+    @pytest.mark.commits  # the change feed needs now() to move on
+    def test_list_customer_changes(self):
+        """It should page through created, updated and deleted Customers"""
+        app.config["CHANGE_FEED_LAG"] = 0
+        customers = self._create_customer(3)
+        self.client.put(f"{BASE_URL}/{customers[0].id}/suspend")
+        self.client.delete(f"{BASE_URL}/{customers[1].id}")
+
+        response = self.client.get(f"{BASE_URL}/changes", query_string="limit=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page = response.get_json()
+        self.assertTrue(page["has_more"])
+        self.assertEqual([change["customer"]["id"] for change in page["changes"]], [customers[2].id, customers[0].id])
+        self.assertEqual(page["changes"][1]["customer"]["status"], "suspended")
+
+        response = self.client.get(f"{BASE_URL}/changes", query_string={"since": page["next"], "limit": 2})
+        page = response.get_json()
+        self.assertFalse(page["has_more"])
+        self.assertEqual(page["changes"], [{"op": "delete", "id": customers[1].id}])
+
+        # nothing new since the last page keeps the same cursor
+        response = self.client.get(f"{BASE_URL}/changes", query_string={"since": page["next"]})
+        self.assertEqual(response.get_json(), {"changes": [], "next": page["next"], "has_more": False})
+
+    @pytest.mark.commits  # the change feed needs now() to move on
+    def test_list_customer_changes_lag(self):
+        """It should hold back changes that have not settled"""
+        app.config["CHANGE_FEED_LAG"] = 60
+        self._create_customer(1)
+        response = self.client.get(f"{BASE_URL}/changes")
+        self.assertEqual(response.get_json()["changes"], [])
+
+    def test_list_customer_changes_bad_cursor(self):
+        """It should not accept a cursor it did not issue"""
+        response = self.client.get(f"{BASE_URL}/changes", query_string="since=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # ----------------------------------------------------------
+    # TEST COMPRESSION
+    # ----------------------------------------------------------
+    def test_gzip_large_response(self):
+        """It should gzip a large listing when the client accepts it"""
+        self._create_customer(20)
+        plain = self.client.get(BASE_URL)
+        response = self.client.get(BASE_URL, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data))
+
+    def test_no_accept_encoding(self):
+        """It should not compress when the client does not accept it"""
+        self._create_customer(20)
+        response = self.client.get(BASE_URL, headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(len(response.get_json()), 20)
+
+    def test_small_response(self):
+        """It should not compress responses below the size threshold"""
+        response = self.client.get("/health", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_compression_disabled(self):
+        """It should not compress when compression is turned off"""
+        self._create_customer(20)
+        app.config["COMPRESSION_ENABLED"] = False
+        response = self.client.get(BASE_URL, headers={"Accept-Encoding": "gzip"})
+        app.config["COMPRESSION_ENABLED"] = True
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_compression_level_above_gzip(self):
+        """It should cap the compression level at the highest gzip allows"""
+        self._create_customer(20)
+        plain = self.client.get(BASE_URL)
+        with patch.dict(app.config, {"COMPRESSION_LEVEL": 19}):
+            response = self.client.get(BASE_URL, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+    def test_streamed_response(self):
+        """It should compress a streamed response chunk by chunk"""
+        chunks = ["[", '{"id": 1}', b"]"]
+        with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+            response = compress_response(Response(iter(chunks)))
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertNotIn("Content-Length", response.headers)
+            self.assertEqual(gzip.decompress(b"".join(response.response)), b'[{"id": 1}]')
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli(self):  # pragma: no cover
+        """It should prefer brotli when it is installed"""
+        self._create_customer(20)
+        plain = self.client.get(BASE_URL).data
+        response = self.client.get(BASE_URL, headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.data), plain)
+
+    @skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):  # pragma: no cover
+        """It should prefer zstd when it is installed"""
+        self._create_customer(20)
+        plain = self.client.get(BASE_URL).data
+        response = self.client.get(BASE_URL, headers={"Accept-Encoding": "gzip, zstd"})
+        self.assertEqual(response.headers["Content-Encoding"], "zstd")
+        self.assertEqual(zstandard.ZstdDecompressor().decompress(response.data, len(plain)), plain)
+
 
 ######################################################################
 #  T E S T   S A D   P A T H S
@@ -424,6 +851,25 @@ class TestSadPaths(TestCase):
         response = self.client.post(BASE_URL)
         self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
 
+    def test_create_customer_content_type_parameters(self):
+        """It should accept a JSON Content-Type with parameters"""
+        test_customer = CustomerFactory()
+        response = self.client.post(
+            BASE_URL, json=test_customer.serialize(), headers={"Content-Type": "Application/JSON; charset=utf-8"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_create_customer_every_error(self):
+        """It should list every problem with a new Customer"""
+        data = CustomerFactory().serialize()
+        data.update(email="nobody", phone_number=5551234)
+        response = self.client.post(BASE_URL, json=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.get_json()["errors"],
+            ["email is not a valid email", "phone_number must be a string"],
+        )
+
     def test_create_customer_wrong_content_type(self):
         """It should not Create a Pet with the wrong content type"""
         response = self.client.post(BASE_URL, data="hello", content_type="text/html")
@@ -0,0 +1,77 @@
+"""
+Test cases for Single Flight
+"""
+import threading
+import time
+from unittest import TestCase
+from service.common.singleflight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+    """Single Flight Tests"""
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow_call(self):
+        """Blocks until released and counts how many times it ran"""
+        self.calls += 1
+        self.release.wait(5)
+        return "result"
+
+    def run_concurrently(self, count: int, func) -> list:
+        """Starts count threads calling func through the flight"""
+        results = []
+        errors = []
+        started = threading.Barrier(count + 1)
+
+        def worker():
+            started.wait(5)
+            try:
+                results.append(self.flight.do("key", func))
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        # give every follower time to join the leader's call
+        started.wait(5)
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results + errors
+
+    def test_single_call(self):
+        """It should call through and report it was not shared"""
+        self.release.set()
+        self.assertEqual(self.flight.do("key", self.slow_call), ("result", False))
+        self.assertEqual(self.flight._calls, {})
+
+    def test_coalesce_concurrent_calls(self):
+        """It should share one call between concurrent callers"""
+        results = self.run_concurrently(5, self.slow_call)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual([shared for _, shared in results].count(False), 1)
+        self.assertTrue(all(result == "result" for result, _ in results))
+
+    def test_share_errors(self):
+        """It should raise the leader's error in every caller"""
+        def failing_call():
+            self.release.wait(5)
+            raise ValueError("boom")
+
+        errors = self.run_concurrently(3, failing_call)
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+    def test_separate_keys(self):
+        """It should not share calls for different keys"""
+        self.release.set()
+        self.flight.do("one", self.slow_call)
+        self.flight.do("two", self.slow_call)
+        self.assertEqual(self.calls, 2)
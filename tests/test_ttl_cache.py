@@ -0,0 +1,49 @@
+"""
+Test cases for the TTL Cache
+"""
+from unittest import TestCase
+from unittest.mock import patch
+from service.common.ttl_cache import TTLCache
+
+
+class TestTTLCache(TestCase):
+    """TTL Cache Tests"""
+
+    def setUp(self):
+        self.calls = 0
+
+    def loader(self):
+        """Counts how many times it is called"""
+        self.calls += 1
+        return self.calls
+
+    def test_cache_value(self):
+        """It should return the cached value until it expires"""
+        cache = TTLCache(10)
+        with patch("service.common.ttl_cache.time.monotonic", return_value=100):
+            self.assertEqual(cache.get_or_load("key", self.loader), 1)
+            self.assertEqual(cache.get_or_load("key", self.loader), 1)
+            self.assertEqual(cache.get_or_load("other", self.loader), 2)
+        with patch("service.common.ttl_cache.time.monotonic", return_value=111):
+            self.assertEqual(cache.get_or_load("key", self.loader), 3)
+
+    def test_disabled(self):
+        """It should always load when the ttl is 0"""
+        cache = TTLCache(0)
+        cache.get_or_load("key", self.loader)
+        self.assertEqual(cache.get_or_load("key", self.loader), 2)
+
+    def test_max_entries(self):
+        """It should not grow past max_entries"""
+        cache = TTLCache(10, max_entries=2)
+        for key in range(3):
+            cache.get_or_load(key, self.loader)
+        self.assertEqual(len(cache._entries), 2)
+        self.assertEqual(cache.get_or_load(2, self.loader), 4)
+
+    def test_clear(self):
+        """It should forget everything when cleared"""
+        cache = TTLCache(10)
+        cache.get_or_load("key", self.loader)
+        cache.clear()
+        self.assertEqual(cache.get_or_load("key", self.loader), 2)
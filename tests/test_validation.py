@@ -0,0 +1,67 @@
+"""
+Test cases for Request Validation
+"""
+from datetime import date
+from unittest import TestCase
+from service.common.validation import EMAIL, PHONE, Field, Schema
+
+SCHEMA = Schema(
+    Field("name", min_length=1, max_length=5),
+    Field("email", pattern=EMAIL),
+    Field("phone_number", required=False, pattern=PHONE),
+    Field("member_since", is_date=True),
+)
+
+
+class TestValidation(TestCase):
+    """Request Validation Tests"""
+
+    def test_valid_payload(self):
+        """It should convert a valid payload and ignore unknown fields"""
+        values, errors = SCHEMA.validate(
+            {"name": "Ann", "email": "ann@example.com", "member_since": "2024-02-29", "id": 7}
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            values, {"name": "Ann", "email": "ann@example.com", "member_since": date(2024, 2, 29)}
+        )
+
+    def test_report_every_error(self):
+        """It should report every problem with a payload at once"""
+        _, errors = SCHEMA.validate(
+            {"name": "", "email": "ann", "phone_number": "call me", "member_since": 2024}
+        )
+        self.assertEqual(
+            errors,
+            [
+                "name must not be empty",
+                "email is not a valid email",
+                "phone_number is not a valid phone number",
+                "member_since must be a date",
+            ],
+        )
+        _, errors = SCHEMA.validate({"name": "Annabel", "member_since": "29/02/2024"})
+        self.assertEqual(
+            errors,
+            [
+                "name must be at most 5 characters",
+                "missing email",
+                "member_since must be a date in YYYY-MM-DD format",
+            ],
+        )
+
+    def test_partial(self):
+        """It should only check the fields present in a partial payload"""
+        self.assertEqual(SCHEMA.validate({"name": "Ann"}, partial=True), ({"name": "Ann"}, []))
+        self.assertEqual(SCHEMA.validate({"name": 5}, partial=True), ({}, ["name must be a string"]))
+
+    def test_not_an_object(self):
+        """It should reject a payload that is not an object"""
+        self.assertEqual(SCHEMA.validate(["Ann"]), ({}, ["body of request must be a JSON object"]))
+
+    def test_phone_numbers(self):
+        """It should accept common phone number formats"""
+        for number in ("555-0100", "+1 (555) 010-0100", "555.010.0100 x123", "001-555-0100ext.4"):
+            self.assertIsNotNone(PHONE.fullmatch(number), number)
+        for number in ("--", "five five five", "555-0100 x"):
+            self.assertIsNone(PHONE.fullmatch(number), number)